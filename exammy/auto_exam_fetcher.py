@@ -8,17 +8,26 @@ One-liner example:
 import os
 import re
 import sys
+import json
 import time
+import asyncio
+import hashlib
 import tempfile
+import threading
+from contextlib import contextmanager
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 import io
 import base64
 from mistralai import Mistral
 
+from extract import extract_structured
+
 # ===================== CONFIG =====================
 import itertools
 import random
@@ -32,17 +41,82 @@ API_KEYS = [
 MODEL = "mistral-large-latest"
 OCR_MODEL = "mistral-ocr-latest"
 
-# Use an infinite cyclic iterator for round-robin access
-_api_cycle = itertools.cycle(API_KEYS)
+# Shared HTTP session (keep-alive + pooled TLS connections); test.py reuses it
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.3)),
+)
+SESSION.headers.update({'User-Agent': 'Mozilla/5.0'})
+
+# Token-efficient OCR defaults: markdown tables, no images, no page headers/footers
+OCR_OPTIONS = {
+    "include_image_base64": False,
+    "table_format": "markdown",
+    "extract_header": False,
+    "extract_footer": False,
+}
+
+# How PDFs become JSON: "ocr" = OCR then chat (default), "document" = one chat call
+# reading the PDFs directly, falling back to "ocr" on error
+STRUCTURE_MODE = os.getenv("STRUCTURE_MODE", "ocr")
+
+# "agent" = keep SYSTEM_PROMPT server-side on a Mistral agent instead of re-sending
+# it with every paper, "off" = plain chat.complete with the system message
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "agent")
+
+# "rules_first" = build the JSON from OCR markdown with extract.py and only call the
+# LLM when the rules aren't confident, "llm_only" = always use the LLM
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "rules_first")
+
+# Content-addressed cache for OCR text and structured JSON (keyed by PDF SHA-256)
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", ".ocr_cache"))
+
+# What ocr_whole_pdf returns in place of text when OCR fails; never cached
+OCR_ERROR_PREFIX = "[Error processing PDF"
+
+# Seconds between status polls of a Mistral batch job
+BATCH_POLL_SECONDS = 15
+
+# Max Mistral calls in flight per API key (rate control instead of a fixed sleep).
+# Threading primitives because the SDK calls run in worker threads.
+PER_KEY_CONCURRENCY = int(os.getenv("PER_KEY_CONCURRENCY", 3))
+
+_KEY_LOCK = threading.Lock()
+_clients: list = [None] * len(API_KEYS)           # one Mistral client per key, built lazily
+_key_busy = [0] * len(API_KEYS)                   # calls in flight / waiting per key
+_key_slots = [threading.BoundedSemaphore(PER_KEY_CONCURRENCY) for _ in API_KEYS]
+_key_rr = itertools.count()                       # round-robin tie breaker
+
 
-# How long to wait between each Mistral call (seconds)
-REQUEST_DELAY = 3
+def _client_for(i: int) -> Mistral:
+    with _KEY_LOCK:
+        if _clients[i] is None:
+            _clients[i] = Mistral(api_key=API_KEYS[i])
+        return _clients[i]
 
 
 def get_client():
-    """Return a Mistral client with the next rotated API key."""
-    key = next(_api_cycle)
-    return Mistral(api_key=key)
+    """Return a Mistral client with the next rotated API key (thread-safe)."""
+    with _KEY_LOCK:
+        i = next(_key_rr) % len(API_KEYS)
+    return _client_for(i)
+
+
+@contextmanager
+def mistral_client():
+    """Yield the client of the least-busy API key, holding one of its slots for the call."""
+    with _KEY_LOCK:
+        start = next(_key_rr)
+        order = [(start + k) % len(API_KEYS) for k in range(len(API_KEYS))]
+        i = min(order, key=_key_busy.__getitem__)
+        _key_busy[i] += 1
+    try:
+        with _key_slots[i]:
+            yield _client_for(i)
+    finally:
+        with _KEY_LOCK:
+            _key_busy[i] -= 1
 
 
 SYSTEM_PROMPT = """You are an intelligent parser that extracts **complete** information from OCR-scanned CAIE question papers (QP) and mark schemes (MS) and returns a fully-populated JSON payload.
@@ -88,7 +162,8 @@ SYSTEM_PROMPT = """You are an intelligent parser that extracts **complete** info
 
 Return only the JSON object. No commentary or markdown fences outside the JSON."""
 
-client = get_client()
+# Changes whenever SYSTEM_PROMPT is edited; part of the structured-JSON cache key
+_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode()).hexdigest()[:12]
 
 # ===================== UTILITIES =====================
 def _url(subj: str, yr: str, ssn: str, var: str, suffix: str) -> str:
@@ -101,159 +176,445 @@ def _url(subj: str, yr: str, ssn: str, var: str, suffix: str) -> str:
         f"{subj}_{ssn}{yr[-2:]}_{suffix}_{var}.pdf"
     )
 
-def _download(url: str, dest: Path) -> bool:
+def _json_path(subj: str, yr: str, ssn: str, var: str, out_dir: str) -> Path:
+    """Where fetch_and_process saves the structured JSON for one paper."""
+    return Path(out_dir) / f"{subj}_{ssn}{yr[-2:]}_{var}.json"
+
+
+def _load_existing(json_file: Path) -> Optional[str]:
+    """Return the saved JSON text if the file exists and parses, else None."""
     try:
-        r = requests.get(url, stream=True, timeout=10, headers={'User-Agent': 'Mozilla/5.0'})
-        if r.status_code != 200 or 'application/pdf' not in r.headers.get('content-type', ''):
-            return False
-        dest.write_bytes(r.content)
+        if json_file.stat().st_size == 0:
+            return None
+        text = json_file.read_text(encoding="utf-8")
+        json.loads(text)
+        return text
+    except (OSError, ValueError):
+        return None
+
+def _download(url: str, dest: Path) -> Optional[int]:
+    """Stream url to dest; returns bytes written if it's a non-empty PDF, else None."""
+    try:
+        size = 0
+        # PDFs are already compressed – don't pay for gzip on top
+        with SESSION.get(url, stream=True, timeout=10, headers={'Accept-Encoding': 'identity'}) as r:
+            if r.status_code != 200 or 'application/pdf' not in r.headers.get('content-type', ''):
+                return None
+            with open(dest, "wb") as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    f.write(chunk)
+                    size += len(chunk)
         # quick magic-byte check
-        return dest.read_bytes()[:4] == b'%PDF'
+        with open(dest, "rb") as f:
+            return size if f.read(4) == b'%PDF' else None
     except Exception:
-        return False
+        return None
+
+
+def _join_pages(markdowns) -> str:
+    """Combine per-page OCR markdown into one text with page banners."""
+    full_text = ""
+    for i, md in enumerate(markdowns):
+        page_text = md.strip() if md else ""
+        full_text += f"\n--- Page {i+1} ---\n{page_text}\n"
+    return full_text.strip()
 
 
 def ocr_whole_pdf(pdf_path: Path) -> str:
     """OCR the entire PDF at once using Mistral OCR."""
-    try:
-        client = get_client()
-        
-        print(f"Processing entire PDF: {pdf_path.name}")
-        
-        # Step 1: Upload the PDF file
-        print(f"  - Uploading {pdf_path.name}...")
-        uploaded_pdf = client.files.upload(
-            file={
-                "file_name": pdf_path.name,
-                "content": open(pdf_path, "rb"),
-            },
-            purpose="ocr"
-        )
-        
-        # Step 2: Get signed URL
-        print(f"  - Getting signed URL...")
-        signed_url = client.files.get_signed_url(file_id=uploaded_pdf.id)
-        
-        # Step 3: Process OCR
-        print(f"  - Running OCR...")
-        resp = client.ocr.process(
-            model=OCR_MODEL,
-            document={
-                "type": "document_url",
-                "document_url": signed_url.url,
-            },
-            include_image_base64=False,
-        )
-        
-        # Step 4: Combine all pages' markdown content
-        full_text = ""
-        if resp.pages:
-            for i, page in enumerate(resp.pages):
-                page_text = page.markdown.strip() if page.markdown else ""
-                full_text += f"\n--- Page {i+1} ---\n{page_text}\n"
-        
-        # Step 5: Clean up - delete the uploaded file
+    with mistral_client() as client:
         try:
-            client.files.delete(file_id=uploaded_pdf.id)
-            print(f"  - Cleaned up uploaded file")
-        except Exception as cleanup_error:
-            print(f"  - Warning: Could not delete uploaded file: {cleanup_error}")
         
-        time.sleep(REQUEST_DELAY)
-        return full_text.strip()
+            print(f"Processing entire PDF: {pdf_path.name}")
         
-    except Exception as e:
-        print(f"Error OCRing PDF {pdf_path.name}: {e}")
-        return f"[Error processing PDF: {e}]"
+            # Step 1: Upload the PDF file
+            print(f"  - Uploading {pdf_path.name}...")
+            with pdf_path.open("rb") as fh:
+                uploaded_pdf = client.files.upload(
+                    file={
+                        "file_name": pdf_path.name,
+                        "content": fh,
+                    },
+                    purpose="ocr"
+                )
+
+            try:
+                # Step 2: Get signed URL
+                print(f"  - Getting signed URL...")
+                signed_url = client.files.get_signed_url(file_id=uploaded_pdf.id)
+
+                # Step 3: Process OCR
+                print(f"  - Running OCR...")
+                resp = client.ocr.process(
+                    model=OCR_MODEL,
+                    document={
+                        "type": "document_url",
+                        "document_url": signed_url.url,
+                    },
+                    **OCR_OPTIONS,
+                )
+
+                # Step 4: Combine all pages' markdown content
+                return _join_pages(page.markdown for page in (resp.pages or []))
+
+            finally:
+                # Step 5: Clean up - delete the uploaded file, even if OCR failed
+                try:
+                    client.files.delete(file_id=uploaded_pdf.id)
+                    print(f"  - Cleaned up uploaded file")
+                except Exception as cleanup_error:
+                    print(f"  - Warning: Could not delete uploaded file: {cleanup_error}")
+
+        except Exception as e:
+            print(f"Error OCRing PDF {pdf_path.name}: {e}")
+            return f"{OCR_ERROR_PREFIX}: {e}]"
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_write(cache_file: Path, text: str) -> None:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(text, encoding="utf-8")
+
+
+def ocr_batch(urls: Dict[str, str]) -> Dict[str, str]:
+    """
+    OCR many public PDFs in one Mistral batch job (roughly half the per-page price).
+    urls: {custom_id: pdf_url}  ->  {custom_id: full_text} for every request that succeeded.
+    """
+    client = get_client()
+    lines = [
+        json.dumps({
+            "custom_id": custom_id,
+            "body": {
+                "document": {"type": "document_url", "document_url": url},
+                **OCR_OPTIONS,
+            },
+        })
+        for custom_id, url in urls.items()
+    ]
+
+    print(f"Submitting OCR batch job with {len(lines)} PDFs …")
+    batch_file = client.files.upload(
+        file={"file_name": "ocr_batch.jsonl", "content": "\n".join(lines).encode("utf-8")},
+        purpose="batch",
+    )
+    job = client.batch.jobs.create(
+        input_files=[batch_file.id],
+        model=OCR_MODEL,
+        endpoint="/v1/ocr",
+    )
+
+    while job.status in ("QUEUED", "RUNNING"):
+        time.sleep(BATCH_POLL_SECONDS)
+        job = client.batch.jobs.get(job_id=job.id)
+        print(f"  - batch {job.id}: {job.status} "
+              f"({job.succeeded_requests + job.failed_requests}/{job.total_requests})")
+
+    if job.status != "SUCCESS" or not job.output_file:
+        raise RuntimeError(f"OCR batch job {job.id} ended with status {job.status}")
+
+    results = {}
+    output = client.files.download(file_id=job.output_file)
+    for line in output.iter_lines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        response = entry.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        pages = response.get("body", {}).get("pages", [])
+        results[entry["custom_id"]] = _join_pages(page.get("markdown") for page in pages)
+    return results
+
+
+def _ocr_cached(pdf_path: Path, digest: str, prefetched: Optional[str] = None) -> str:
+    """
+    ocr_whole_pdf, but skip Mistral entirely if this exact PDF was OCRed before.
+    prefetched: text already OCRed elsewhere (e.g. ocr_batch) – just cache and return it.
+    """
+    cache_file = OCR_CACHE_DIR / f"{digest}.md"
+    if prefetched is None and cache_file.exists():
+        print(f"  - OCR cache hit for {pdf_path.name}")
+        return cache_file.read_text(encoding="utf-8")
+    text = ocr_whole_pdf(pdf_path) if prefetched is None else prefetched
+    if not text.startswith(OCR_ERROR_PREFIX):
+        _cache_write(cache_file, text)
+    return text
+
+
+_PAGE_RE = re.compile(r"page\s+\d+ of \d+", re.I)
+_PAGE_BOILERPLATE_RE = re.compile(r"^\s*(?:--- page \d+ ---|page\s+\d+ of \d+)\s*$", re.I)
 
 
 def clean_insert_text(raw: str) -> str:
     """very light cleaning"""
-    lines = [ln.strip() for ln in raw.splitlines()]
-    lines = [ln for ln in lines if ln and not re.match(r"page\s+\d+ of \d+", ln, re.I)]
-    return "\n".join(lines).strip()
+    return "\n".join(
+        s for s in (ln.strip() for ln in raw.splitlines()) if s and not _PAGE_RE.match(s)
+    )
+
+
+def clean_ocr_text(raw: str) -> str:
+    """Drop page banners / 'Page N of M' lines and blank lines; keeps indentation (code answers)."""
+    return "\n".join(
+        ln.rstrip() for ln in raw.splitlines() if ln.strip() and not _PAGE_BOILERPLATE_RE.match(ln)
+    )
+
+
+# ===================== ASYNC HELPERS =====================
+async def _download_all(subj: str, yr: str, ssn: str, var: str, tmp_dir: Path) -> Dict[str, Path]:
+    """Download QP / MS / IN concurrently; returns {suffix: local_path} for the ones that exist."""
+    async def _one(suffix: str) -> Optional[Path]:
+        url = _url(subj, yr, ssn, var, suffix)
+        local = tmp_dir / f"{suffix}.pdf"
+        print(f"Checking {suffix.upper()} => {url}")
+        if await asyncio.to_thread(_download, url, local):
+            print(f"  ✓ saved {local}")
+            return local
+        print(f"  ✗ {suffix.upper()} not found / empty")
+        if local.exists():
+            local.unlink()
+        return None
+
+    suffixes = ("qp", "ms", "in")
+    results = await asyncio.gather(*(_one(s) for s in suffixes))
+    return {s: p for s, p in zip(suffixes, results) if p}
+
+
+async def _ocr_all(files: Dict[str, Path], digests: Dict[str, str], ocr_texts: Dict[str, str]):
+    """OCR QP, MS and (optional) INSERT concurrently; returns (qp_text, ms_text, in_raw)."""
+    async def _no_insert() -> str:
+        return ""
+
+    def _ocr(suffix: str):
+        return asyncio.to_thread(_ocr_cached, files[suffix], digests[suffix], ocr_texts.get(suffix))
+
+    return await asyncio.gather(
+        _ocr("qp"),
+        _ocr("ms"),
+        _ocr("in") if "in" in files else _no_insert(),
+    )
+
+
+# ===================== STRUCTURING =====================
+_agent_ids: Dict[Mistral, str] = {}    # one structuring agent per API key's client
+_agent_locks: Dict[Mistral, threading.Lock] = {}  # serializes find/create per client
+
+# Agents persist on the account: find ours by name instead of creating one per run.
+# The prompt version is in the name, so editing SYSTEM_PROMPT gets a fresh agent.
+_AGENT_NAME = f"CAIE exam structurer {_PROMPT_VERSION}"
+_AGENT_PAGE_SIZE = 100
+
+
+def _find_agent(client: Mistral) -> Optional[str]:
+    """Id of an existing structuring agent on this key's account, if there is one."""
+    page = 0
+    while True:
+        agents = client.beta.agents.list(page=page, page_size=_AGENT_PAGE_SIZE)
+        for agent in agents:
+            if agent.name == _AGENT_NAME and agent.model == MODEL:
+                return agent.id
+        if len(agents) < _AGENT_PAGE_SIZE:
+            return None
+        page += 1
+
+
+def _structuring_agent(client: Mistral) -> str:
+    """Find or create (once per key) an agent that carries SYSTEM_PROMPT as its instructions."""
+    # _KEY_LOCK only guards the dicts; the network lookup/create runs under a per-client lock
+    # so it can't stall mistral_client() key picks, and concurrent papers can't both create one
+    with _KEY_LOCK:
+        agent_id = _agent_ids.get(client)
+        if agent_id is not None:
+            return agent_id
+        lock = _agent_locks.setdefault(client, threading.Lock())
+    with lock:
+        with _KEY_LOCK:
+            agent_id = _agent_ids.get(client)
+        if agent_id is None:
+            agent_id = _find_agent(client)
+            if agent_id is None:
+                agent_id = client.beta.agents.create(
+                    model=MODEL,
+                    name=_AGENT_NAME,
+                    instructions=SYSTEM_PROMPT,
+                    completion_args={"response_format": {"type": "json_object"}},
+                ).id
+            with _KEY_LOCK:
+                _agent_ids[client] = agent_id
+    return agent_id
+
+
+def _structure_call(user_content) -> str:
+    """
+    One structuring request. With PROMPT_CACHE=agent the static SYSTEM_PROMPT lives
+    server-side on an agent and each paper only sends its own content; with
+    PROMPT_CACHE=off (or if the agent call fails) it's a plain chat.complete.
+    """
+    with mistral_client() as client:
+        if PROMPT_CACHE == "agent":
+            try:
+                resp = client.beta.conversations.start(
+                    agent_id=_structuring_agent(client),
+                    inputs=[{"role": "user", "content": user_content}],
+                    store=False,
+                )
+                out = resp.outputs[-1].content
+                return out if isinstance(out, str) else "".join(getattr(c, "text", "") for c in out)
+            except Exception as e:
+                print(f"  !! agent call failed, using chat.complete : {e}")
+
+        chat_resp = client.chat.complete(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_content},
+            ],
+            response_format={"type": "json_object"},
+        )
+    return chat_resp.choices[0].message.content
+
+
+def _structure_from_ocr(
+    files: Dict[str, Path],
+    digests: Dict[str, str],
+    ocr_texts: Dict[str, str],
+    paper: Tuple[str, str, str, str],
+) -> Tuple[str, bool]:
+    """
+    Two-stage pipeline: OCR every PDF, then rules (or one chat call) turn the text into JSON.
+    Returns (structured_json, ocr_ok); ocr_ok is False if any PDF came back as an OCR error.
+    """
+    # ---- OCR phase - Process entire PDFs at once, all three in parallel ----
+    print("\nOCRing QP / MS / INSERT ...")
+    qp_text, ms_text, in_raw = asyncio.run(_ocr_all(files, digests, ocr_texts))
+    ocr_ok = not any(t.startswith(OCR_ERROR_PREFIX) for t in (qp_text, ms_text, in_raw))
+    qp_text, ms_text = clean_ocr_text(qp_text), clean_ocr_text(ms_text)
+    in_text = clean_insert_text(in_raw) if in_raw else ""
+
+    # ---- rule-based structuring: skip the LLM when the OCR markdown is regular enough ----
+    if EXTRACT_MODE == "rules_first":
+        payload = extract_structured(qp_text, ms_text, in_text, *paper)
+        if payload is not None:
+            print("Structured locally – skipping LLM")
+            return json.dumps(payload, indent=2, ensure_ascii=False), ocr_ok
+        print("Rule-based extraction not confident – using LLM")
+
+    # ---- LLM structuring ----
+    print("Parsing with Mistral …")
+    # compact envelope – the json_object response needs no prose framing
+    return _structure_call(json.dumps(
+        {"qp": qp_text, "ms": ms_text, "context": in_text or None},
+        ensure_ascii=False,
+    )), ocr_ok
+
+
+def structure_from_documents(doc_urls: Dict[str, str]) -> str:
+    """
+    Single-pass "document understanding": the chat model reads the PDFs directly,
+    so there is no OCR round trip and no OCR markdown on the wire.
+    doc_urls: {"qp"|"ms"|"in": pdf_url}
+    """
+    suffixes = [s for s in ("qp", "ms", "in") if s in doc_urls]
+    names = {"qp": "question paper", "ms": "mark scheme", "in": "insert"}
+    content = [{"type": "document_url", "document_url": doc_urls[s]} for s in suffixes]
+    content.append({
+        "type": "text",
+        "text": (
+            f"Documents in order: {', '.join(names[s] for s in suffixes)}. "
+            "Produce the JSON payload per schema."
+        ),
+    })
+
+    print("Parsing PDFs directly with Mistral …")
+    structured_json = _structure_call(content)
+    json.loads(structured_json)  # raise (=> fall back) on anything that isn't valid JSON
+    return structured_json
 
 
 # ===================== CORE =====================
-def fetch_and_process(subj: str, yr: str, ssn: str, var: str, out_dir: str = "output_json") -> Dict[str, Any]:
+def fetch_and_process(
+    subj: str,
+    yr: str,
+    ssn: str,
+    var: str,
+    out_dir: str = "output_json",
+    ocr_texts: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
     """
     subj: 9618
     yr  : 2023
     ssn : s | w | m
     var : 32
+    ocr_texts: optional {"qp"|"ms"|"in": text} already OCRed (batch mode); those files skip OCR
     """
     Path(out_dir).mkdir(exist_ok=True)
-    base_name = f"{subj}_{ssn}{yr[-2:]}_{var}"
-
-    # ---- download files ----
-    files = {}
-    tmp_dir = Path(tempfile.mkdtemp())
-    for suffix in ("qp", "ms", "in"):
-        url = _url(subj, yr, ssn, var, suffix)
-        local = tmp_dir / f"{suffix}.pdf"
-        print(f"Checking {suffix.upper()} => {url}")
-        if _download(url, local) and local.stat().st_size > 0:
-            files[suffix] = local
-            print(f"  ✓ saved {local}")
+    json_file = _json_path(subj, yr, ssn, var, out_dir)
+
+    # ---- already done? skip all network I/O ----
+    existing = _load_existing(json_file)
+    if existing is not None:
+        print(f"Already processed => {json_file}")
+        return {"json_path": str(json_file), "data": existing, "cached": True}
+
+    # ---- download files (QP / MS / IN concurrently) ----
+    # (temp dir is removed on exit, even when a step below raises)
+    with tempfile.TemporaryDirectory(prefix="exammy_") as td:
+        files = asyncio.run(_download_all(subj, yr, ssn, var, Path(td)))
+
+        qp_path = files.get("qp")
+        ms_path = files.get("ms")
+
+        if not qp_path or not ms_path:
+            raise FileNotFoundError("QP or MS missing – aborting.")
+
+        # ---- cache lookup: identical PDFs => identical JSON, skip OCR + LLM ----
+        digests = {suffix: _sha256(path) for suffix, path in files.items()}
+        # anything that changes the output is part of the key: model, modes, prompt text
+        struct_key = hashlib.sha256(
+            ":".join(
+                [MODEL, STRUCTURE_MODE, EXTRACT_MODE, _PROMPT_VERSION]
+                + [digests.get(s, "") for s in ("qp", "ms", "in")]
+            ).encode()
+        ).hexdigest()
+        struct_cache = OCR_CACHE_DIR / f"{struct_key}.json"
+
+        if struct_cache.exists():
+            print("Structured JSON cache hit – skipping OCR + LLM")
+            structured_json = struct_cache.read_text(encoding="utf-8")
         else:
-            print(f"  ✗ not found / empty")
-            if local.exists():
-                local.unlink()
-
-    qp_path = files.get("qp")
-    ms_path = files.get("ms")
-    in_path = files.get("in")
-
-    if not qp_path or not ms_path:
-        raise FileNotFoundError("QP or MS missing – aborting.")
-
-    # ---- OCR phase - Process entire PDFs at once ----
-    print("\nOCRing entire QP...")
-    qp_text = ocr_whole_pdf(qp_path)
-    
-    print("OCRing entire MS...")
-    ms_text = ocr_whole_pdf(ms_path)
-    
-    in_text = ""
-    if in_path:
-        print("OCRing entire INSERT...")
-        in_text = clean_insert_text(ocr_whole_pdf(in_path))
+            structured_json, cacheable = None, True
+            if STRUCTURE_MODE == "document":
+                try:
+                    doc_urls = {suffix: _url(subj, yr, ssn, var, suffix) for suffix in files}
+                    structured_json = structure_from_documents(doc_urls)
+                except Exception as e:
+                    print(f"  !! document understanding failed, falling back to OCR : {e}")
+            if structured_json is None:
+                structured_json, cacheable = _structure_from_ocr(
+                    files, digests, ocr_texts or {}, (subj, yr, ssn, var)
+                )
+            # only cache a result that is valid JSON built from real OCR text, so one
+            # bad reply or a transient OCR failure doesn't stick to this paper for good
+            if not cacheable:
+                print("  !! OCR failed for at least one PDF – not caching the result")
+            else:
+                try:
+                    json.loads(structured_json)
+                    _cache_write(struct_cache, structured_json)
+                except ValueError:
+                    print("  !! structured output is not valid JSON – not caching it")
+
+        # ---- save ----
+        json_file.write_text(structured_json, encoding="utf-8")
+        print(f"Saved => {json_file}")
 
-    # ---- LLM structuring ----
-    
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {
-            "role": "user",
-            "content": (
-                f"CONTEXT (Insert):\n{in_text or 'no context required'}\n\n"
-                f"QUESTION PAPER TEXT:\n{qp_text}\n\n"
-                f"MARK SCHEME TEXT:\n{ms_text}"
-            ),
-        },
-    ]
-    print("Parsing with Mistral …")
-    client = get_client()
-    chat_resp = client.chat.complete(
-        model=MODEL,
-        messages=messages,
-        response_format={"type": "json_object"},
-    )
-    structured_json = chat_resp.choices[0].message.content
-    time.sleep(REQUEST_DELAY)
-
-    # ---- save ----
-    json_file = Path(out_dir) / f"{base_name}.json"
-    json_file.write_text(structured_json, encoding="utf-8")
-    print(f"Saved => {json_file}")
-    
-    # Clean up temporary files
-    try:
-        import shutil
-        shutil.rmtree(tmp_dir)
-    except:
-        pass
-    
     return {"json_path": str(json_file), "data": structured_json}
 
 
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+extract.py
+Rule-based first pass: build the SYSTEM_PROMPT JSON schema straight from the
+Mistral OCR markdown of a QP + MS, without an LLM call.
+
+extract_structured(...) returns None whenever the result looks incomplete
+(missing marks, QP/MS labels that don't line up, ...) so the caller can fall
+back to the chat.complete path.
+"""
+
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+# "1 " / "12 " at the start of a line – a question number
+_Q_RE = re.compile(r"^[ \t]*(\d{1,2})[ \t]", re.M)
+# "(a)", "(ii)", "(b) (i)" at the start of a line – a sub-question label
+_SUB_RE = re.compile(r"^[ \t]*\(([a-z]|[ivx]{1,4})\)(?:[ \t]*\(([ivx]{1,4})\))?", re.M | re.I)
+# "[3]" at the end of a line – marks
+_MARKS_RE = re.compile(r"\[(\d+)\]\s*$", re.M)
+# MS table key cell: "1", "1(a)", "1(a)(ii)", "1 (b) (i)"
+_MS_KEY_RE = re.compile(r"^(\d{1,2})\s*(?:\(([a-z])\))?\s*(?:\(([ivx]{1,4})\))?$", re.I)
+_ROMAN = {"i", "ii", "iii", "iv", "v", "vi", "vii", "viii", "ix", "x"}
+
+SESSIONS = {"s": "Summer", "w": "Winter", "m": "March"}
+
+
+# ===================== QUESTION PAPER =====================
+def _split_questions(qp: str) -> List[Tuple[str, str]]:
+    """Split QP text into [(question_number, body)], accepting only 1, 2, 3, ... in order."""
+    positions: Dict[int, List[Tuple[int, int]]] = {}
+    for m in _Q_RE.finditer(qp):
+        positions.setdefault(int(m.group(1)), []).append((m.start(), m.end()))
+
+    starts = []
+    pos, n = 0, 1
+    while n in positions:
+        after = [p for p in positions[n] if p[0] >= pos]
+        if not after:
+            break
+        # the cover page can mention "1 hour" etc.: take the last "n" before the first "n+1"
+        nxt = [p[0] for p in positions.get(n + 1, []) if p[0] > after[0][0]]
+        cands = [p for p in after if not nxt or p[0] < nxt[0]]
+        start, body_start = cands[-1]
+        starts.append((str(n), start, body_start))
+        pos = body_start
+        n += 1
+
+    out = []
+    for i, (num, _, body_start) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else len(qp)
+        out.append((num, qp[body_start:end].strip()))
+    return out
+
+
+def _split_subquestions(body: str) -> List[Tuple[str, str]]:
+    """Split one question body into [(label, text)], e.g. [("a", ...), ("b(i)", ...)]."""
+    matches = list(_SUB_RE.finditer(body))
+    if not matches:
+        return [("", body)]
+
+    segments = []
+    letter = None
+    for i, m in enumerate(matches):
+        first, second = m.group(1).lower(), (m.group(2) or "").lower()
+        if second:
+            letter, label = first, f"{first}({second})"
+        elif letter and first in _ROMAN and not (first == "i" and letter == "h"):
+            label = f"{letter}({first})"
+        else:
+            letter, label = first, first
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(body)
+        segments.append((label, body[m.end():end].strip()))
+
+    # stem text before the first label belongs to the first sub-question
+    stem = body[:matches[0].start()].strip()
+    if stem:
+        segments[0] = (segments[0][0], f"{stem}\n{segments[0][1]}")
+
+    # "(a) intro ... (i) ... [2] (ii) ... [3]": fold the un-marked "(a)" intro into its parts
+    merged = []
+    for i, (label, text) in enumerate(segments):
+        nxt = segments[i + 1][0] if i + 1 < len(segments) else ""
+        if not _MARKS_RE.search(text) and nxt.startswith(f"{label}("):
+            for j in range(i + 1, len(segments)):
+                if segments[j][0].startswith(f"{label}("):
+                    segments[j] = (segments[j][0], f"{text}\n{segments[j][1]}")
+            continue
+        merged.append((label, text))
+    return merged
+
+
+def _question_type(text: str, marks: int) -> str:
+    if "|" in text:
+        return "table_completion"
+    return "long_answer" if marks >= 4 else "short_answer"
+
+
+# ===================== MARK SCHEME =====================
+def _parse_mark_scheme(ms: str) -> Dict[Tuple[str, str], List[str]]:
+    """Read MS markdown tables into {(question_number, label): [answer lines]}."""
+    answers: Dict[Tuple[str, str], List[str]] = {}
+    current = None
+    for line in ms.splitlines():
+        line = line.strip()
+        if not line.startswith("|"):
+            continue
+        cells = [c.strip() for c in line.strip("|").split("|")]
+        head = cells[0]
+        if head.lower() == "question" or (head and set(head) <= set("-: ")):
+            continue  # repeated header / separator row
+        key = _MS_KEY_RE.match(head.replace(" ", ""))
+        if key:
+            num, letter, roman = key.group(1), (key.group(2) or "").lower(), (key.group(3) or "").lower()
+            current = (num, f"{letter}({roman})" if roman else letter)
+            answers.setdefault(current, [])
+        elif head:
+            current = None  # some other table
+        if current is None:
+            continue
+        # everything between the key cell and the marks cell is answer text
+        body = cells[1:-1] if len(cells) > 2 else cells[1:]
+        for cell in body:
+            answers[current].extend(
+                s for s in (p.strip() for p in cell.replace("<br>", "\n").splitlines()) if s
+            )
+    return answers
+
+
+# ===================== PUBLIC =====================
+def extract_structured(
+    qp_text: str,
+    ms_text: str,
+    in_text: str,
+    subj: str,
+    yr: str,
+    ssn: str,
+    var: str,
+) -> Optional[Dict[str, Any]]:
+    """Return the structured payload, or None if the rules aren't confident."""
+    questions = _split_questions(qp_text)
+    answers = _parse_mark_scheme(ms_text)
+    if not questions or not answers:
+        return None
+
+    out_questions = []
+    seen = set()
+    for num, body in questions:
+        subs = []
+        for label, text in _split_subquestions(body):
+            marks = sum(int(m) for m in _MARKS_RE.findall(text))
+            answer_lines = answers.get((num, label))
+            if not text or not marks or not answer_lines:
+                return None
+            seen.add((num, label))
+            subs.append({
+                "subquestion_label": label,
+                "question_text": _MARKS_RE.sub("", text).strip(),
+                "question_type": _question_type(text, marks),
+                "marks": marks,
+                "answer": "\n".join(answer_lines),
+                "answer_conditions": answer_lines,
+            })
+        out_questions.append({"question_number": num, "subquestions": subs})
+
+    # every MS entry must have landed on a QP sub-question, otherwise the split is off
+    if seen != set(answers):
+        return None
+
+    return {
+        "subject_code": subj,
+        "paper_code": var,
+        "exam_session": SESSIONS.get(ssn, ssn),
+        "exam_year": yr,
+        "context": in_text or "no insert provided",
+        "questions": out_questions,
+    }
@@ -5,13 +5,16 @@ Run:
     python batch_fetcher.py
 """
 
+import os
+import tempfile
 import itertools
 from pathlib import Path
-import subprocess
+from typing import Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ----- import the function you already have -----
 # (auto_exam_fetcher.py must be in the same folder or on PYTHONPATH)
-from auto_exam_fetcher import fetch_and_process
+from auto_exam_fetcher import fetch_and_process, ocr_batch, SESSION, _url, _json_path, _load_existing
 
 
 # ===================== CONFIGURATION =====================
@@ -21,42 +24,110 @@ SEASONS  = ["m","s", "w"]                        # s = summer, w = winter
 VARIANTS = ["11", "12", "13", "21", "22", "23", "31", "32", "33","41", "42", "43"]
 
 OUT_DIR  = "batch_output"
+# Papers processed in parallel; Mistral calls are still capped by
+# PER_KEY_CONCURRENCY (per API key) inside auto_exam_fetcher.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+# OCR through the Mistral batch API: auto = only when >= BATCH_MIN_FILES PDFs
+BATCH_MODE      = os.getenv("BATCH_MODE", "auto")          # auto | always | never
+BATCH_MIN_FILES = int(os.getenv("BATCH_MIN_FILES", 10))
 Path(OUT_DIR).mkdir(exist_ok=True)
 
+# Keep downloaded PDFs on a ramdisk unless TMPDIR says otherwise
+if "TMPDIR" not in os.environ and os.path.isdir("/dev/shm"):
+    tempfile.tempdir = "/dev/shm"
+
 
 # ===================== HELPER =============================
 def _is_valid_pdf(url: str) -> bool:
     """HEAD request to see if URL points to a real PDF."""
     try:
-        # wget --spider exits 0 only if file exists (HTTP 200)
-        proc = subprocess.run(
-            ["wget", "--spider", "-q", url],
-            capture_output=True,
-            text=True,
-        )
-        return proc.returncode == 0
+        # pooled HEAD on the shared session (no wget fork, no fresh TLS handshake)
+        r = SESSION.head(url, allow_redirects=True, timeout=5)
+        return r.status_code == 200 and "application/pdf" in r.headers.get("content-type", "")
     except Exception:
         return False
 
 
 # ===================== MAIN LOOP ==========================
-def main():
-    total = len(SUBJECTS) * len(YEARS) * len(SEASONS) * len(VARIANTS)
-    counter = 0
-    for subj, yr, ssn, var in itertools.product(SUBJECTS, YEARS, SEASONS, VARIANTS):
-        counter += 1
-        url = (
-            f"https://pastpapers.papacambridge.com/directories/CAIE/CAIE-pastpapers/upload/"
-            f"{subj}_{ssn}{yr[-2:]}_qp_{var}.pdf"
-        )
-        print(f"[{counter:>4}/{total}] Checking {url}")
+def _probe(subj: str, yr: str, ssn: str, var: str) -> Dict[str, str]:
+    """HEAD-check QP / MS / IN; returns {suffix: url} for the ones that exist."""
+    found = {}
+    for suffix in ("qp", "ms", "in"):
+        url = _url(subj, yr, ssn, var, suffix)
         if _is_valid_pdf(url):
+            found[suffix] = url
+        elif suffix == "qp":
+            break
+    return found
+
+
+def _process_one(combo: Tuple[str, str, str, str], ocr_texts: Dict[str, str]) -> str:
+    """Run the full pipeline for one paper; returns a status line."""
+    subj, yr, ssn, var = combo
+    try:
+        fetch_and_process(subj, yr, ssn, var, out_dir=OUT_DIR, ocr_texts=ocr_texts)
+        return f"ok {subj} {yr} {ssn} {var}"
+    except Exception as e:
+        return f"!! Failed {subj} {yr} {ssn} {var} : {e}"
+
+
+def _batch_id(combo: Tuple[str, str, str, str], suffix: str) -> str:
+    return "_".join(combo + (suffix,))
+
+
+def _use_batch(n_files: int) -> bool:
+    if BATCH_MODE == "always":
+        return n_files > 0
+    if BATCH_MODE == "never":
+        return False
+    return n_files >= BATCH_MIN_FILES
+
+
+def main():
+    combos = []
+    for combo in itertools.product(SUBJECTS, YEARS, SEASONS, VARIANTS):
+        # already structured on a previous run – skip even the HEAD checks
+        if _load_existing(_json_path(*combo, OUT_DIR)) is not None:
+            print(f"  == done already {' '.join(combo)}")
+        else:
+            combos.append(combo)
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as ex:
+        # ---- pass 1: find which papers exist ----
+        print(f"Probing {len(combos)} papers …")
+        papers = {}
+        for combo, found in zip(combos, ex.map(lambda c: _probe(*c), combos)):
+            if "qp" in found and "ms" in found:
+                papers[combo] = found
+            else:
+                print(f"  -- skipped (not found) {' '.join(combo)}")
+
+        # ---- OCR: one batch job for every PDF, or per-file inside fetch_and_process ----
+        batch_texts = {}
+        n_files = sum(len(found) for found in papers.values())
+        if _use_batch(n_files):
+            urls = {
+                _batch_id(combo, suffix): url
+                for combo, found in papers.items()
+                for suffix, url in found.items()
+            }
             try:
-                fetch_and_process(subj, yr, ssn, var, out_dir=OUT_DIR)
+                batch_texts = ocr_batch(urls)
             except Exception as e:
-                print(f"  !! Failed {subj} {yr} {ssn} {var} : {e}")
-        else:
-            print("  -- skipped (not found)")
+                print(f"  !! OCR batch failed, falling back to per-file OCR : {e}")
+
+        # ---- pass 2: structure each paper ----
+        total = len(papers)
+        futures = []
+        for combo, found in papers.items():
+            ocr_texts = {
+                suffix: batch_texts[_batch_id(combo, suffix)]
+                for suffix in found
+                if _batch_id(combo, suffix) in batch_texts
+            }
+            futures.append(ex.submit(_process_one, combo, ocr_texts))
+        for counter, fut in enumerate(as_completed(futures), 1):
+            print(f"[{counter:>4}/{total}] {fut.result()}")
 
 
 if __name__ == "__main__":
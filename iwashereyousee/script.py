@@ -1,13 +1,16 @@
 import os
+import asyncio
 import json
+import importlib.util
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from datetime import datetime
 from dotenv import load_dotenv
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import time
 
 # Load .env
 load_dotenv()
@@ -20,26 +23,56 @@ EMAIL_PASS = os.getenv("EMAIL_PASS")
 EMAIL_TO = os.getenv("EMAIL_TO")
 
 EXTRACT_FILE = "extract.json"
+EXTRACT_LOG = "extract.jsonl"  # append-only log of records not yet saved to EXTRACT_FILE
+SAVE_EVERY = 50                # rewrite EXTRACT_FILE every N new posts
+CONCURRENCY = 8                # archive / post pages fetched in parallel
+POLITE_DELAY = 1               # seconds each fetch slot waits before being reused
 BASE_URL = "https://iwashereyousee.blogspot.com"
 
+# One keep-alive session for every request to the blog
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+))
+SESSION.headers.update({"User-Agent": "Mozilla/5.0"})
+
+# lxml is much faster on Blogspot pages; fall back to the stdlib parser if it isn't installed
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
 # Load existing JSON data
 if os.path.exists(EXTRACT_FILE):
     with open(EXTRACT_FILE, "r") as f:
         data = json.load(f)
 else:
     data = []
+seen_titles = {p["title"] for p in data}
+
+# Recover records logged after the last full save (e.g. the run crashed)
+if os.path.exists(EXTRACT_LOG):
+    with open(EXTRACT_LOG, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["title"] not in seen_titles:
+                data.append(record)
+                seen_titles.add(record["title"])
 
 def save_json():
     with open(EXTRACT_FILE, "w") as f:
         json.dump(data, f, indent=4)
+    # everything is in EXTRACT_FILE now, start a fresh log
+    open(EXTRACT_LOG, "w").close()
 
 
 def fetch_archive_posts(year, month):
     """Return list of posts with title, href, and publish_time"""
     url = f"{BASE_URL}/{year}/{str(month).zfill(2)}"
-    r = requests.get(url)
+    r = SESSION.get(url, timeout=10)
     r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.content, HTML_PARSER)
     posts = []
 
     for h3 in soup.find_all("h3", class_="post-title entry-title"):
@@ -69,9 +102,9 @@ def fetch_archive_posts(year, month):
     return posts
 
 def fetch_post_content(url):
-    r = requests.get(url)
+    r = SESSION.get(url, timeout=10)
     r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
+    soup = BeautifulSoup(r.content, HTML_PARSER)
     body_div = soup.find("div", class_="post-body-container")
 
     if body_div:
@@ -86,19 +119,118 @@ def fetch_post_content(url):
 
 
 
-def send_email(subject, html_content):
+def smtp_connect():
+    server = smtplib.SMTP("smtp.gmail.com", 587)
+    server.starttls()
+    server.login(EMAIL_USER, EMAIL_PASS)
+    return server
+
+
+def send_email(server, subject, html_content):
+    """Send over an open SMTP connection; (re)connects if needed and returns the live connection."""
     msg = MIMEMultipart()
     msg["From"] = EMAIL_USER
     msg["To"] = EMAIL_TO
     msg["Subject"] = subject
     msg.attach(MIMEText(html_content, "html"))
 
-    server = smtplib.SMTP("smtp.gmail.com", 587)
-    server.starttls()
-    server.login(EMAIL_USER, EMAIL_PASS)
-    server.send_message(msg)
-    server.quit()
+    if server is None:
+        server = smtp_connect()
+    try:
+        server.send_message(msg)
+    except smtplib.SMTPServerDisconnected:
+        server = smtp_connect()
+        server.send_message(msg)
     print("Email sent")
+    return server
+
+async def _fetch_limited(sem, func, *args):
+    """Run a blocking fetch in a thread, holding one of the CONCURRENCY slots (plus the delay)."""
+    async with sem:
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            await asyncio.sleep(POLITE_DELAY)
+
+
+async def _email_worker(queue):
+    """Send queued emails one at a time over a single SMTP connection (login once per run)."""
+    server = None
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            try:
+                server = await asyncio.to_thread(send_email, server, *item)
+            except Exception as e:
+                print(f"Failed to send email for {item[0]}: {e}")
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                pass
+
+
+async def scrape(months, log):
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    # ---- archive pages, all months concurrently ----
+    print(f"Scraping {len(months)} months...")
+    archives = await asyncio.gather(
+        *(_fetch_limited(sem, fetch_archive_posts, year, month) for year, month in months),
+        return_exceptions=True,
+    )
+
+    new_posts = []
+    queued = set()
+    for (year, month), posts in zip(months, archives):
+        if isinstance(posts, Exception):
+            print(f"Failed to fetch {year}-{month}: {posts}")
+            continue
+        for post in posts:
+            if post["title"] in seen_titles or post["title"] in queued:
+                continue  # already processed
+            queued.add(post["title"])
+            new_posts.append(post)
+
+    # ---- post pages concurrently; records/emails still go out oldest first ----
+    emails = asyncio.Queue()
+    email_task = asyncio.create_task(_email_worker(emails))
+    tasks = [
+        asyncio.create_task(_fetch_limited(sem, fetch_post_content, post["href"]))
+        for post in new_posts
+    ]
+    for post, task in zip(new_posts, tasks):
+        title = post["title"]
+        href = post["href"]
+        try:
+            content_text, publish_time = await task
+            if not post["publish_time"]:
+                post["publish_time"] = publish_time
+        except Exception as e:
+            print(f"Failed to fetch post {href}: {e}")
+            continue
+
+        record = {
+            "title": title,
+            "href": href,
+            "extract": content_text,
+            "time": publish_time
+        }
+        data.append(record)
+        seen_titles.add(title)
+        log.write(json.dumps(record) + "\n")
+        log.flush()
+
+        if len(data) % SAVE_EVERY == 0:
+            save_json()
+        emails.put_nowait((title, content_text))
+
+    emails.put_nowait(None)
+    await email_task
+
 
 def main():
     start_year = 2022
@@ -107,40 +239,20 @@ def main():
     end_year = now.year
     end_month = now.month
 
-    for year in range(start_year, end_year + 1):
-        for month in range(1, 13):
-            if year == end_year and month > end_month:
-                break
-            print(f"Scraping {year}-{str(month).zfill(2)}...")
-            try:
-                posts = fetch_archive_posts(year, month)
-            except Exception as e:
-                print(f"Failed to fetch {year}-{month}: {e}")
-                continue
+    months = [
+        (year, month)
+        for year in range(start_year, end_year + 1)
+        for month in range(1, 13)
+        if not (year == end_year and month > end_month)
+    ]
+
+    log = open(EXTRACT_LOG, "a")
+    try:
+        asyncio.run(scrape(months, log))
+    finally:
+        log.close()
+        save_json()
 
-            for post in posts:
-                title = post["title"]
-                href = post["href"]
-                if any(post['title'] == title for post in data):
-                    continue  # already processed
-                try:
-                    content_html, publish_time = fetch_post_content(href)
-                    if not post["publish_time"]:
-                        post["publish_time"] = publish_time
-                except Exception as e:
-                    print(f"Failed to fetch post {href}: {e}")
-                    continue
-
-                data.append({
-                    "title": title,
-                    "href": href,
-                    "extract": content_text,
-                    "time": publish_time
-                })
-
-                save_json()
-                send_email(title, content_html)
-                time.sleep(1)  # small delay
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 import asyncio
+import atexit
 import os
+import re
+import sys
+import time
 import json
-import threading
-import queue
+from collections import deque
 from datetime import datetime
 from mistralai import Mistral
 from mistralai.extra.run.context import RunContext
@@ -15,12 +18,159 @@ from dotenv import load_dotenv
 # Import our config manager
 from utils.config_manager import ConfigManager
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback with the same call shape
+    orjson = None
+
+try:
+    import uvloop  # faster event loop; not available on Windows
+except ImportError:
+    uvloop = None
+
+try:
+    import msgspec
+except ImportError:  # falls back to json_loads / json_dumps below
+    msgspec = None
+
+try:
+    from aioconsole import ainput
+except ImportError:
+    async def ainput(prompt=""):
+        """Read a line in a worker thread so the event loop keeps running."""
+        return await asyncio.to_thread(input, prompt)
+
 load_dotenv()
 
 # Set the current working directory and model to use
 cwd = Path(__file__).parent
 MODEL = "mistral-medium-latest"
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
 LOG_FILE = "chat_log.log"
+HISTORY_SUMMARY_LEN = 3  # interactions echoed back to the agent on each continuation
+
+# System prompt for the assistant agent
+_AGENT_INSTRUCTIONS = """
+You are an intelligent AI assistant with dynamic server management and self-reasoning capabilities. 
+
+CORE CAPABILITIES:
+- Web automation, search, file operations, git, memory, vision, user interaction
+- Dynamic server installation and management
+- Terminal command execution with user approval
+- Self-prompting and iterative reasoning for complex tasks
+
+DYNAMIC SERVER BEHAVIOR:
+1. When you lack capabilities for a user request, use the mcp_manager tools to:
+   - Search for servers with required capabilities
+   - Present installation options to user
+   - Handle API key setup instructions
+   - Install and configure new servers
+
+2. For terminal commands, ALWAYS use the terminal server tools:
+   - Use 'prepare_command_batch' for multiple related commands
+   - Use 'execute_command' for single commands  
+   - Commands require user approval before execution
+   - Show clear descriptions of what each command does
+
+3. For user interaction:
+   - Use user_interaction tools when you need clarification
+   - Ask before making significant changes
+   - Handle ambiguous requests by asking specific questions
+
+4. For complex tasks requiring multi-step reasoning:
+   - Use self_prompting tools to break down complex problems
+   - Initiate reasoning chains for analysis, planning, or problem-solving
+   - Each self-prompt must stay relevant to the original objective
+   - Always explain your reasoning process to the user
+   - Stop when objective is achieved or no new insights emerge
+
+SELF-PROMPTING GUIDELINES:
+- Only use for genuinely complex tasks that benefit from iterative reasoning
+- Always ask user permission before starting extended reasoning chains
+- Keep each iteration focused and cite specific evidence
+- Provide progress updates to user during long reasoning chains
+- Maximum 6 iterations per chain unless user explicitly requests more
+- If confidence drops or you're repeating ideas, terminate the chain
+
+WORKFLOW EXAMPLES:
+- User asks for weather: Search for weather servers → Present installation → Get API key → Install → Use
+- User asks to run multiple commands: Batch them → Show all commands → Get approval → Execute approved ones
+- User request is ambiguous: Use ask_user to clarify before proceeding
+- Complex analysis task: Ask permission → Start self-prompting chain → Provide incremental insights → Present final conclusion
+
+Always be proactive about extending your capabilities while maintaining focused, relevant responses.
+"""
+
+# Structured output "type" values we react to
+_REASONING_TYPES = frozenset({"reasoning_initiated", "reasoning_continued", "reasoning_completed"})
+_USER_INTERACTION_TYPES = frozenset({"user_input_required", "command_approval_required"})
+
+# Plain-text hints that an agent message is asking the user something
+_MARKER_RE = re.compile(
+    "user_input_required|ask_user|confirm_action|request_choice|command_approval_required",
+    re.IGNORECASE,
+)
+
+def _json_default(obj):
+    """Serialize SDK / pydantic objects that show up in log records."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+if orjson is not None:
+    JSONDecodeError = orjson.JSONDecodeError
+
+    def json_loads(data):
+        return orjson.loads(data)
+
+    def json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_json_default)
+else:
+    JSONDecodeError = json.JSONDecodeError
+    json_loads = json.loads
+
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj, default=_json_default).encode("utf-8")
+
+# Output entries / log records: compiled msgspec codecs when available
+if msgspec is not None:
+    class LogEntry(msgspec.Struct):
+        timestamp: str
+        user_prompt: str
+        tools_used: list[str]
+        response: dict
+
+    _log_encoder = msgspec.json.Encoder(enc_hook=_json_default)
+    _entry_decoder = msgspec.json.Decoder(dict)
+    EntryDecodeError = msgspec.DecodeError
+
+    def encode_log_entry(timestamp, user_prompt, tools_used, response) -> bytes:
+        return _log_encoder.encode(LogEntry(timestamp, user_prompt, tools_used, response))
+
+    def loads_entry(content) -> dict:
+        """Decode an output entry that should hold a JSON object."""
+        return _entry_decoder.decode(content)
+else:
+    EntryDecodeError = ValueError
+
+    def encode_log_entry(timestamp, user_prompt, tools_used, response) -> bytes:
+        return json_dumps({
+            "timestamp": timestamp,
+            "user_prompt": user_prompt,
+            "tools_used": tools_used,
+            "response": response
+        })
+
+    def loads_entry(content) -> dict:
+        """Decode an output entry that should hold a JSON object."""
+        data = json_loads(content)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+# Everything loads_entry raises for "not a JSON object": bad JSON, wrong JSON type,
+# or content that isn't str/bytes at all
+ENTRY_DECODE_ERRORS = (EntryDecodeError, ValueError, TypeError)
 
 class TaskResult(BaseModel):
     task: str
@@ -32,84 +182,116 @@ class TaskResult(BaseModel):
 
 class UserInteraction:
     def __init__(self):
-        self.input_queue = queue.Queue()
-        self.response_queue = queue.Queue()
+        self.input_queue: asyncio.Queue[str] = asyncio.Queue()
+        self.response_queue: asyncio.Queue[str] = asyncio.Queue()
         self.waiting_for_input = False
-        self.lock = threading.Lock()
     
-    def request_user_input(self, question: str) -> str:
+    async def request_user_input(self, question: str) -> str:
         """Request input from user and wait for response"""
-        with self.lock:
-            self.waiting_for_input = True
-            self.input_queue.put(question)
-            
-        # Wait for user response
-        response = self.response_queue.get()
-        
-        with self.lock:
+        self.waiting_for_input = True
+        self.input_queue.put_nowait(question)
+        try:
+            # Wait for user response without parking a thread
+            return await self.response_queue.get()
+        finally:
             self.waiting_for_input = False
-            
-        return response
     
     def provide_user_response(self, response: str):
         """Provide user response"""
-        self.response_queue.put(response)
+        self.response_queue.put_nowait(response)
     
     def has_pending_question(self) -> tuple[bool, str]:
         """Check if there's a pending question"""
-        with self.lock:
-            if self.waiting_for_input and not self.input_queue.empty():
-                try:
-                    question = self.input_queue.get_nowait()
-                    return True, question
-                except queue.Empty:
-                    pass
+        if self.waiting_for_input and self.input_queue.qsize():
+            try:
+                return True, self.input_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
         return False, ""
 
 # Global instances
 user_interaction = UserInteraction()
 config_manager = ConfigManager()
 
+# Log records are queued raw by log_interaction; _log_writer formats and writes them on one open handle
+_log_q: "asyncio.Queue[tuple]" = asyncio.Queue()
+_log_fh = None
+
+def _open_log():
+    global _log_fh
+    if _log_fh is None:
+        _log_fh = open(LOG_FILE, "ab", buffering=1 << 16)
+        atexit.register(_log_fh.close)
+    return _log_fh
+
+def _flush_log():
+    """Write out anything still queued (used on shutdown)."""
+    fh = _open_log()
+    while not _log_q.empty():
+        fh.write(_format_log_record(*_log_q.get_nowait()))
+    fh.flush()
+
+async def _log_writer():
+    """Background task: drain the log queue so disk I/O overlaps the next agent run."""
+    fh = _open_log()
+    while True:
+        record = await _log_q.get()
+        fh.write(_format_log_record(*record))
+        fh.flush()
+
+def _format_log_record(timestamp_ns, user_prompt, tools_used, response_data) -> bytes:
+    """Encode one queued record as a JSON line with an ISO timestamp."""
+    timestamp = datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+    return encode_log_entry(timestamp, user_prompt, tools_used, response_data) + b"\n"
+
 def log_interaction(user_prompt, tools_used, response_data):
-    """Log the interaction to a file."""
-    timestamp = datetime.now().isoformat()
-    log_entry = {
-        "timestamp": timestamp,
-        "user_prompt": user_prompt,
-        "tools_used": tools_used,
-        "response": response_data
-    }
-    
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(log_entry) + "\n")
+    """Queue the interaction for the background log writer."""
+    _log_q.put_nowait((time.time_ns(), user_prompt, tools_used, response_data))
 
 def extract_tools_used(run_result):
     """Extract list of tools used from run result."""
-    tools = []
+    return list(dict.fromkeys(
+        entry.name for entry in run_result.output_entries
+        if getattr(entry, 'type', None) == 'function.call' and getattr(entry, 'name', None)
+    ))
+
+def iter_entries(run_result):
+    """Lazily decode each output entry's JSON content: yields (entry, dict or None)."""
     for entry in run_result.output_entries:
-        if hasattr(entry, 'type') and entry.type == 'function.call' and hasattr(entry, 'name'):
-            tools.append(entry.name)
-    return list(set(tools))
+        json_data = None
+        if hasattr(entry, 'content') and entry.content:
+            try:
+                json_data = loads_entry(entry.content)
+            except ENTRY_DECODE_ERRORS:
+                pass
+        yield entry, json_data
 
-def extract_response_content(run_result):
+def parse_entries(run_result):
+    """Decode each output entry's JSON content once: [(entry, dict or None)]."""
+    return list(iter_entries(run_result))
+
+def extract_response_content(run_result, parsed=None):
     """Extract the actual response content from run result."""
+    if parsed is None:
+        parsed = parse_entries(run_result)
     response_content = []
-    for entry in run_result.output_entries:
+    for entry, json_data in parsed:
         if hasattr(entry, 'type') and entry.type == 'message.output':
             if hasattr(entry, 'content'):
-                try:
-                    json_data = json.loads(entry.content)
+                if json_data is not None:
                     # Special handling for reasoning responses
-                    if json_data.get('type') in ['reasoning_initiated', 'reasoning_continued', 'reasoning_completed']:
+                    if json_data.get('type') in _REASONING_TYPES:
                         return f"🧠 Self-Reasoning: {json_data.get('message', json_data.get('status', 'Processing...'))}"
                     if 'result' in json_data:
                         return json_data['result']
-                except:
-                    pass
                 response_content.append(entry.content)
     
     return '\n'.join(response_content) if response_content else "No response found"
 
+def summarize(run_result):
+    """Tools used and response text for logging."""
+    return extract_tools_used(run_result), extract_response_content(run_result)
+
 async def setup_mcp_clients(run_ctx):
     """Setup all MCP clients from configuration."""
     print("Loading MCP servers from configuration...")
@@ -118,6 +300,8 @@ async def setup_mcp_clients(run_ctx):
     clients = []
     failed_servers = []
     
+    # Registration enters the client's stdio/session contexts on run_ctx's exit
+    # stack; those are bound to the entering task, so register from this task only
     for server_name, server_config in all_servers.items():
         try:
             # Create server parameters from config
@@ -133,38 +317,39 @@ async def setup_mcp_clients(run_ctx):
             failed_servers.append(f"{server_name} ({str(e)})")
             continue
     
-    print(f"MCP Clients loaded: {', '.join(clients)}")
-    if failed_servers:
-        print(f"Failed to load: {', '.join(failed_servers)}")
+    sys.stdout.write(
+        f"MCP Clients loaded: {', '.join(clients)}\n"
+        + (f"Failed to load: {', '.join(failed_servers)}\n" if failed_servers else "")
+    )
     
     return len(clients), len(failed_servers)
 
-def check_for_user_interaction_request(run_result):
+def check_for_user_interaction_request(run_result, parsed=None):
     """Check if the run result contains a user interaction request"""
     try:
+        # Decode lazily and stop at the first request; keep what was decoded
+        # so the fallback below doesn't decode the entries a second time
+        entries = iter_entries(run_result) if parsed is None else parsed
+        seen = []
         # Check output entries for user interaction requests
-        for entry in run_result.output_entries:
+        for entry, content in entries:
+            seen.append((entry, content))
             if hasattr(entry, 'content') and entry.content:
-                try:
-                    content = json.loads(entry.content)
-                    if content.get("type") in ["user_input_required", "command_approval_required"]:
+                if content is not None:
+                    if content.get("type") in _USER_INTERACTION_TYPES:
                         return True, content
-                except json.JSONDecodeError:
-                    # Check if it's a text response that indicates need for user input
-                    if any(marker in entry.content.lower() for marker in [
-                        "user_input_required", "ask_user", "confirm_action", "request_choice", 
-                        "command_approval_required"
-                    ]):
-                        return True, {"question": entry.content, "type": "user_input_required"}
+                elif isinstance(entry.content, str) and _MARKER_RE.search(entry.content):
+                    # Text response that indicates need for user input
+                    return True, {"question": entry.content, "type": "user_input_required"}
         
         # Check the main response
-        response_text = extract_response_content(run_result)
+        response_text = extract_response_content(run_result, seen)
         if response_text:
             try:
-                response_json = json.loads(response_text)
-                if response_json.get("type") in ["user_input_required", "command_approval_required"]:
+                response_json = loads_entry(response_text)
+                if response_json.get("type") in _USER_INTERACTION_TYPES:
                     return True, response_json
-            except json.JSONDecodeError:
+            except ENTRY_DECODE_ERRORS:
                 pass
         
         return False, {}
@@ -172,10 +357,9 @@ def check_for_user_interaction_request(run_result):
         print(f"Error checking for user interaction: {e}")
         return False, {}
 
-def handle_command_approval(interaction_data):
+async def handle_command_approval(interaction_data):
     """Handle command approval requests"""
-    print(f"\n{interaction_data.get('batch_description', 'Command Execution Request')}")
-    print("=" * 60)
+    lines = [f"\n{interaction_data.get('batch_description', 'Command Execution Request')}", "=" * 60]
     
     commands = interaction_data.get("commands", [])
     for cmd in commands:
@@ -184,17 +368,19 @@ def handle_command_approval(interaction_data):
         description = cmd.get("description", "")
         working_dir = cmd.get("working_directory", "")
         
-        print(f"{index}. {description}")
-        print(f"   Command: {command}")
+        lines.append(f"{index}. {description}")
+        lines.append(f"   Command: {command}")
         if working_dir:
-            print(f"   Directory: {working_dir}")
-        print()
+            lines.append(f"   Directory: {working_dir}")
+        lines.append("")
     
-    print("Which commands do you approve?")
-    print("Enter: 'all', 'none', or comma-separated numbers (e.g., '1,3,5')")
+    lines.append("Which commands do you approve?")
+    lines.append("Enter: 'all', 'none', or comma-separated numbers (e.g., '1,3,5')")
+    # One write for the whole block instead of a print per line
+    sys.stdout.write("\n".join(lines) + "\n")
     
     while True:
-        user_input = input("Your choice: ").strip().lower()
+        user_input = (await ainput("Your choice: ")).strip().lower()
         
         if user_input == "all":
             approved = list(range(1, len(commands) + 1))
@@ -228,7 +414,7 @@ def handle_command_approval(interaction_data):
 async def handle_task_with_interruption(client, run_ctx, user_input):
     """Handle a task that might need user interruption"""
     current_context = {}
-    conversation_history = []
+    recent_history = deque(maxlen=HISTORY_SUMMARY_LEN)
     
     while True:
         try:
@@ -238,7 +424,7 @@ async def handle_task_with_interruption(client, run_ctx, user_input):
                 inputs=user_input,
             )
             
-            # Check if the agent is requesting user input
+            # Check if the agent is requesting user input (stops decoding at the first request)
             needs_input, interaction_data = check_for_user_interaction_request(run_result)
             
             if needs_input:
@@ -246,7 +432,7 @@ async def handle_task_with_interruption(client, run_ctx, user_input):
                 
                 if interaction_type == "command_approval_required":
                     # Handle command approval
-                    user_response = handle_command_approval(interaction_data)
+                    user_response = await handle_command_approval(interaction_data)
                 else:
                     # Handle general user input
                     question = interaction_data.get("question", "Do you want to continue?")
@@ -267,19 +453,20 @@ async def handle_task_with_interruption(client, run_ctx, user_input):
                         print(f"Suggested options: {', '.join(options)}")
                     
                     # Get user response
-                    user_response = input("Your response: ").strip()
+                    user_response = (await ainput("Your response: ")).strip()
                 
                 # Add to conversation history
-                conversation_history.append({
+                interaction = {
                     "interaction_type": interaction_type,
                     "agent_question": interaction_data.get("question", ""),
                     "user_response": user_response,
                     "context": current_context.copy()
-                })
+                }
+                recent_history.append(interaction)
                 
                 # Prepare the continuation input
-                context_summary = json.dumps(current_context) if current_context else "previous interaction"
-                history_summary = f"Conversation history: {json.dumps(conversation_history[-3:])}" if conversation_history else ""
+                context_summary = json_dumps(current_context).decode() if current_context else "previous interaction"
+                history_summary = f"Conversation history: {json_dumps(list(recent_history)).decode()}" if recent_history else ""
                 
                 user_input = (
                     f"Based on {context_summary} and {history_summary}, "
@@ -294,84 +481,44 @@ async def handle_task_with_interruption(client, run_ctx, user_input):
             print(f"Error during task execution: {e}")
             raise
 
+_mistral_client = None
+
+def get_client():
+    """One Mistral client per process, reused if main() is entered again."""
+    global _mistral_client
+    if _mistral_client is None:
+        _mistral_client = Mistral(MISTRAL_API_KEY)
+    return _mistral_client
+
 async def main() -> None:
-    api_key = os.getenv("MISTRAL_API_KEY")
-    if not api_key:
+    if not MISTRAL_API_KEY:
         print("Error: MISTRAL_API_KEY not found in environment variables")
         return
         
-    client = Mistral(api_key)
-
-    agent_instructions = """
-You are an intelligent AI assistant with dynamic server management and self-reasoning capabilities. 
-
-CORE CAPABILITIES:
-- Web automation, search, file operations, git, memory, vision, user interaction
-- Dynamic server installation and management
-- Terminal command execution with user approval
-- Self-prompting and iterative reasoning for complex tasks
-
-DYNAMIC SERVER BEHAVIOR:
-1. When you lack capabilities for a user request, use the mcp_manager tools to:
-   - Search for servers with required capabilities
-   - Present installation options to user
-   - Handle API key setup instructions
-   - Install and configure new servers
-
-2. For terminal commands, ALWAYS use the terminal server tools:
-   - Use 'prepare_command_batch' for multiple related commands
-   - Use 'execute_command' for single commands  
-   - Commands require user approval before execution
-   - Show clear descriptions of what each command does
-
-3. For user interaction:
-   - Use user_interaction tools when you need clarification
-   - Ask before making significant changes
-   - Handle ambiguous requests by asking specific questions
-
-4. For complex tasks requiring multi-step reasoning:
-   - Use self_prompting tools to break down complex problems
-   - Initiate reasoning chains for analysis, planning, or problem-solving
-   - Each self-prompt must stay relevant to the original objective
-   - Always explain your reasoning process to the user
-   - Stop when objective is achieved or no new insights emerge
-
-SELF-PROMPTING GUIDELINES:
-- Only use for genuinely complex tasks that benefit from iterative reasoning
-- Always ask user permission before starting extended reasoning chains
-- Keep each iteration focused and cite specific evidence
-- Provide progress updates to user during long reasoning chains
-- Maximum 6 iterations per chain unless user explicitly requests more
-- If confidence drops or you're repeating ideas, terminate the chain
-
-WORKFLOW EXAMPLES:
-- User asks for weather: Search for weather servers → Present installation → Get API key → Install → Use
-- User asks to run multiple commands: Batch them → Show all commands → Get approval → Execute approved ones
-- User request is ambiguous: Use ask_user to clarify before proceeding
-- Complex analysis task: Ask permission → Start self-prompting chain → Provide incremental insights → Present final conclusion
-
-Always be proactive about extending your capabilities while maintaining focused, relevant responses.
-"""
+    client = get_client()
 
     browser_agent = client.beta.agents.create(
         model=MODEL,
         name="Dynamic AI Assistant",
-        instructions=agent_instructions,
+        instructions=_AGENT_INSTRUCTIONS,
         description="AI assistant that can dynamically acquire new capabilities by installing MCP servers"
     )
 
-    print(f"Dynamic AI Assistant initialized")
-    print(f"Using model: {MODEL}")
-    print(f"Log file: {LOG_FILE}")
-    print(f"Configuration: mcp_config.json")
-    print("\nFeatures:")
-    print("- Dynamic server installation")
-    print("- Batch terminal command approval") 
-    print("- Interactive task pausing")
-    print("- Configuration-based server management")
-    print("\nType your request and press Enter. Type 'quit' to exit.")
-    print("-" * 70)
+    sys.stdout.write(
+        "Dynamic AI Assistant initialized\n"
+        f"Using model: {MODEL}\n"
+        f"Log file: {LOG_FILE}\n"
+        "Configuration: mcp_config.json\n"
+        "\nFeatures:\n"
+        "- Dynamic server installation\n"
+        "- Batch terminal command approval\n"
+        "- Interactive task pausing\n"
+        "- Configuration-based server management\n"
+        "\nType your request and press Enter. Type 'quit' to exit.\n"
+        + "-" * 70 + "\n"
+    )
 
+    log_task = asyncio.create_task(_log_writer())
     try:
         async with RunContext(
             agent_id=browser_agent.id,
@@ -386,7 +533,7 @@ Always be proactive about extending your capabilities while maintaining focused,
             
             while True:
                 try:
-                    user_input = input(f"\n> ").strip()
+                    user_input = (await ainput("\n> ")).strip()
                     
                     if user_input.lower() in ['quit', 'exit', 'q']:
                         print("👋 Goodbye!")
@@ -405,7 +552,7 @@ Always be proactive about extending your capabilities while maintaining focused,
                         continue
                     
                     if user_input.lower() == 'reload config':
-                        config_manager._config = None  # Force reload
+                        config_manager.invalidate()  # Force reload
                         print("Configuration reloaded")
                         continue
                     
@@ -413,24 +560,22 @@ Always be proactive about extending your capabilities while maintaining focused,
                     run_result = await handle_task_with_interruption(client, run_ctx, user_input)
                     
                     # Extract and display the final response
+                    tools_used, entries_text = summarize(run_result)
                     if hasattr(run_result, 'output') and run_result.output:
                         if hasattr(run_result.output, 'result'):
                             response_text = run_result.output.result
                         else:
                             response_text = str(run_result.output)
                     else:
-                        response_text = extract_response_content(run_result)
+                        response_text = entries_text
                     
-                    print(f"\nTask completed!")
-                    print(f"{response_text}")
-                    print("-" * 70)
+                    sys.stdout.write(f"\nTask completed!\n{response_text}\n" + "-" * 70 + "\n")
                     
                     # Log the interaction
                     if run_result:
-                        tools_used = extract_tools_used(run_result)
                         response_data = {
                             "output": run_result.output if hasattr(run_result, 'output') else None,
-                            "text": extract_response_content(run_result)
+                            "text": entries_text
                         }
                         log_interaction(user_input, tools_used, response_data)
                     
@@ -447,10 +592,23 @@ Always be proactive about extending your capabilities while maintaining focused,
     except Exception as e:
         if "BrokenResourceError" not in str(e) and "Shutdown signal received" not in str(e):
             print(f"Setup error: {e}")
+    finally:
+        log_task.cancel()
+        _flush_log()
+
+def run(coro):
+    """asyncio.run, on uvloop when it's installed"""
+    if uvloop is None:
+        return asyncio.run(coro)
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(coro)
+    uvloop.install()
+    return asyncio.run(coro)
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except KeyboardInterrupt:
         print("\nSession ended by user.")
     except Exception as e:
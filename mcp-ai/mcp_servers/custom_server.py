@@ -17,22 +17,20 @@ from mcp.types import (
 # Create server instance
 server = Server("custom-server")
 
+# No tools yet; shared so list_tools doesn't build a new list per poll
+_EMPTY_TOOLS: list[Tool] = []
+
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     """List available tools."""
-    return []
-
+    return _EMPTY_TOOLS
 
 
 @server.call_tool()
 async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextContent]:
     """Handle tool calls."""
-    if arguments is None:
-        arguments = {}
-
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+    raise ValueError(f"Unknown tool: {name}")
 
 async def main():
     """Main entry point for the server."""
@@ -7,6 +7,7 @@ import json
 import sys
 import asyncio
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, List
 from mcp.server import Server
@@ -18,98 +19,138 @@ import mcp.types as types
 sys.path.append(str(Path(__file__).parent.parent))
 from utils.config_manager import ConfigManager
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output
+    orjson = None
+
+def _dump(obj) -> str:
+    """Serialize a tool response as 2-space indented JSON text."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+def _text_response(obj) -> list[types.TextContent]:
+    """Wrap a JSON-serializable tool result as the single text content block."""
+    return [types.TextContent(type="text", text=_dump(obj))]
+
+def _plain_text(text: str) -> list[types.TextContent]:
+    """Wrap a plain message (not found, already installed, ...) as a text content block."""
+    return [types.TextContent(type="text", text=text)]
+
 server = Server("mcp_manager")
 config_manager = ConfigManager()
 
+# Per-server lookups repeat within and across tool calls; cleared whenever the config changes
+_get_info = lru_cache(maxsize=256)(config_manager.get_server_info)
+_is_installed = lru_cache(maxsize=256)(config_manager.is_server_installed)
+
+async def _info(name: str) -> dict:
+    """get_server_info off the event loop (a cold cache reads the registry file)."""
+    return await asyncio.to_thread(_get_info, name)
+
+async def _installed(name: str) -> bool:
+    """is_server_installed off the event loop (a cold cache reads the config file)."""
+    return await asyncio.to_thread(_is_installed, name)
+
+# JSON Schema type names shared by the tool schemas below
+_OBJ = "object"
+_STR = "string"
+_BOOL = "boolean"
+_ARR = "array"
+
+# Tool descriptors are static; built once at import
+_TOOLS: list[types.Tool] = [
+    types.Tool(
+        name="search_servers_by_capability",
+        description="Find MCP servers that provide specific capabilities",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "capability": {
+                    "type": _STR,
+                    "description": "The capability you need (e.g., 'weather', 'database', 'github')"
+                }
+            },
+            "required": ["capability"]
+        }
+    ),
+    types.Tool(
+        name="get_server_info",
+        description="Get detailed information about a specific server including installation requirements",
+        inputSchema={
+            "type": _OBJ, 
+            "properties": {
+                "server_name": {
+                    "type": _STR,
+                    "description": "Name of the server to get info about"
+                }
+            },
+            "required": ["server_name"]
+        }
+    ),
+    types.Tool(
+        name="list_installed_servers",
+        description="List all currently installed and configured servers",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {}
+        }
+    ),
+    types.Tool(
+        name="check_installation_requirements", 
+        description="Check what's needed to install a specific server (API keys, dependencies, etc.)",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "server_name": {
+                    "type": _STR,
+                    "description": "Name of the server to check requirements for"
+                }
+            },
+            "required": ["server_name"]
+        }
+    ),
+    types.Tool(
+        name="prepare_installation_plan",
+        description="Create an installation plan for one or more servers including all required steps",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "server_names": {
+                    "type": _ARR,
+                    "items": {"type": _STR},
+                    "description": "List of server names to install"
+                }
+            },
+            "required": ["server_names"]
+        }
+    ),
+    types.Tool(
+        name="install_server",
+        description="Install and configure a server (use only after user approval)",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "server_name": {
+                    "type": _STR,
+                    "description": "Name of the server to install"
+                },
+                "skip_install": {
+                    "type": _BOOL, 
+                    "description": "Skip package installation if already installed",
+                    "default": False
+                }
+            },
+            "required": ["server_name"]
+        }
+    )
+]
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available MCP management tools."""
-    return [
-        types.Tool(
-            name="search_servers_by_capability",
-            description="Find MCP servers that provide specific capabilities",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "capability": {
-                        "type": "string",
-                        "description": "The capability you need (e.g., 'weather', 'database', 'github')"
-                    }
-                },
-                "required": ["capability"]
-            }
-        ),
-        types.Tool(
-            name="get_server_info",
-            description="Get detailed information about a specific server including installation requirements",
-            inputSchema={
-                "type": "object", 
-                "properties": {
-                    "server_name": {
-                        "type": "string",
-                        "description": "Name of the server to get info about"
-                    }
-                },
-                "required": ["server_name"]
-            }
-        ),
-        types.Tool(
-            name="list_installed_servers",
-            description="List all currently installed and configured servers",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
-        ),
-        types.Tool(
-            name="check_installation_requirements", 
-            description="Check what's needed to install a specific server (API keys, dependencies, etc.)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "server_name": {
-                        "type": "string",
-                        "description": "Name of the server to check requirements for"
-                    }
-                },
-                "required": ["server_name"]
-            }
-        ),
-        types.Tool(
-            name="prepare_installation_plan",
-            description="Create an installation plan for one or more servers including all required steps",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "server_names": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of server names to install"
-                    }
-                },
-                "required": ["server_names"]
-            }
-        ),
-        types.Tool(
-            name="install_server",
-            description="Install and configure a server (use only after user approval)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "server_name": {
-                        "type": "string",
-                        "description": "Name of the server to install"
-                    },
-                    "skip_install": {
-                        "type": "boolean", 
-                        "description": "Skip package installation if already installed",
-                        "default": False
-                    }
-                },
-                "required": ["server_name"]
-            }
-        )
-    ]
+    return _TOOLS
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
@@ -120,49 +161,40 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
         matching_servers = config_manager.find_servers_by_capability(capability)
         
         if not matching_servers:
-            return [types.TextContent(
-                type="text",
-                text=f"No servers found for capability: {capability}"
-            )]
+            return _plain_text(f"No servers found for capability: {capability}")
         
-        # Get detailed info for each server
+        # Get detailed info for each server, all lookups at once
+        infos, installed = await asyncio.gather(
+            asyncio.gather(*(_info(n) for n in matching_servers)),
+            asyncio.gather(*(_installed(n) for n in matching_servers)),
+        )
         server_details = []
-        for server_name in matching_servers:
-            info = config_manager.get_server_info(server_name)
+        for server_name, info, is_installed in zip(matching_servers, infos, installed):
             if info:
                 server_details.append({
                     "name": server_name,
                     "description": info.get("description", ""),
                     "capabilities": info.get("capabilities", []),
                     "requires_api_key": info.get("requires_api_key", False),
-                    "installed": config_manager.is_server_installed(server_name)
+                    "installed": is_installed
                 })
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps({
-                "capability_searched": capability,
-                "matching_servers": server_details
-            }, indent=2)
-        )]
+        return _text_response({
+            "capability_searched": capability,
+            "matching_servers": server_details
+        })
     
     elif name == "get_server_info":
         server_name = arguments.get("server_name", "")
-        info = config_manager.get_server_info(server_name)
+        info = _get_info(server_name)
         
         if not info:
-            return [types.TextContent(
-                type="text",
-                text=f"Server '{server_name}' not found in registry"
-            )]
+            return _plain_text(f"Server '{server_name}' not found in registry")
         
-        # Add installation status
-        info["installed"] = config_manager.is_server_installed(server_name)
+        # Add installation status (on a copy; the registry dict is cached)
+        info = {**info, "installed": _is_installed(server_name)}
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(info, indent=2)
-        )]
+        return _text_response(info)
     
     elif name == "list_installed_servers":
         all_servers = config_manager.get_all_servers()
@@ -177,23 +209,17 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
                 "env_required": list(config.get("env", {}).keys())
             })
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps({
-                "installed_servers": server_list,
-                "total_count": len(server_list)
-            }, indent=2)
-        )]
+        return _text_response({
+            "installed_servers": server_list,
+            "total_count": len(server_list)
+        })
     
     elif name == "check_installation_requirements":
         server_name = arguments.get("server_name", "")
-        info = config_manager.get_server_info(server_name)
+        info = _get_info(server_name)
         
         if not info:
-            return [types.TextContent(
-                type="text",
-                text=f"Server '{server_name}' not found in registry"
-            )]
+            return _plain_text(f"Server '{server_name}' not found in registry")
         
         # Check what's missing
         requirements = {
@@ -204,7 +230,7 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
             "env_vars_needed": info.get("env_vars", []),
             "api_key_info": info.get("api_key_info", ""),
             "missing_env_vars": [],
-            "already_installed": config_manager.is_server_installed(server_name)
+            "already_installed": _is_installed(server_name)
         }
         
         # Check which environment variables are missing
@@ -212,10 +238,7 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
             if not os.getenv(env_var):
                 requirements["missing_env_vars"].append(env_var)
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(requirements, indent=2)
-        )]
+        return _text_response(requirements)
     
     elif name == "prepare_installation_plan":
         server_names = arguments.get("server_names", [])
@@ -228,59 +251,58 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
             "already_installed": []
         }
         
-        for server_name in server_names:
-            if config_manager.is_server_installed(server_name):
+        # Gather all lookups up front, then assemble the plan in one pass
+        infos, installed = await asyncio.gather(
+            asyncio.gather(*(_info(n) for n in server_names)),
+            asyncio.gather(*(_installed(n) for n in server_names)),
+        )
+        
+        for server_name, info, is_installed in zip(server_names, infos, installed):
+            if is_installed:
                 plan["already_installed"].append(server_name)
                 continue
                 
-            info = config_manager.get_server_info(server_name)
             if not info:
                 continue
             
+            install_cmds = info.get("install_commands") or []
+            env_vars = info.get("env_vars") or []
+            api_info = info.get("api_key_info", "")
+            needs_key = info.get("requires_api_key", False)
+            
             server_plan = {
                 "name": server_name,
                 "package": info.get("package", ""),
-                "install_commands": info.get("install_commands", []),
-                "requires_api_key": info.get("requires_api_key", False),
-                "env_vars": info.get("env_vars", []),
-                "api_key_info": info.get("api_key_info", "")
+                "install_commands": install_cmds,
+                "requires_api_key": needs_key,
+                "env_vars": env_vars,
+                "api_key_info": api_info
             }
             
             plan["servers_to_install"].append(server_plan)
-            plan["total_commands"].extend(info.get("install_commands", []))
+            plan["total_commands"].extend(install_cmds)
             
-            if info.get("requires_api_key"):
-                plan["api_keys_needed"].extend([
-                    {
-                        "server": server_name,
-                        "vars": info.get("env_vars", []),
-                        "info": info.get("api_key_info", "")
-                    }
-                ])
+            if needs_key:
+                plan["api_keys_needed"].append({
+                    "server": server_name,
+                    "vars": env_vars,
+                    "info": api_info
+                })
             
-            plan["env_vars_needed"].extend(info.get("env_vars", []))
+            plan["env_vars_needed"].extend(env_vars)
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(plan, indent=2)
-        )]
+        return _text_response(plan)
     
     elif name == "install_server":
         server_name = arguments.get("server_name", "")
         skip_install = arguments.get("skip_install", False)
         
-        info = config_manager.get_server_info(server_name)
+        info = _get_info(server_name)
         if not info:
-            return [types.TextContent(
-                type="text",
-                text=f"Error: Server '{server_name}' not found in registry"
-            )]
+            return _plain_text(f"Error: Server '{server_name}' not found in registry")
         
-        if config_manager.is_server_installed(server_name):
-            return [types.TextContent(
-                type="text",
-                text=f"Server '{server_name}' is already installed"
-            )]
+        if _is_installed(server_name):
+            return _plain_text(f"Server '{server_name}' is already installed")
         
         # Create server configuration for dynamic servers
         server_config = {
@@ -293,6 +315,8 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
         
         # Add to dynamic servers
         config_manager.add_dynamic_server(server_name, server_config)
+        _get_info.cache_clear()
+        _is_installed.cache_clear()
         
         result = {
             "action": "install_completed",
@@ -302,14 +326,13 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
             "message": f"Server '{server_name}' has been configured and added to dynamic servers. A restart is required to load the new server."
         }
         
-        if not skip_install and info.get("install_commands"):
-            result["install_commands_needed"] = info.get("install_commands")
-            result["message"] += f" Run these commands first: {'; '.join(info.get('install_commands'))}"
+        install_cmds = info.get("install_commands") or []
+        if not skip_install and install_cmds:
+            joined = "; ".join(install_cmds)
+            result["install_commands_needed"] = install_cmds
+            result["message"] = f"{result['message']} Run these commands first: {joined}"
         
-        return [types.TextContent(
-            type="text",
-            text=json.dumps(result, indent=2)
-        )]
+        return _text_response(result)
     
     else:
         raise ValueError(f"Unknown tool: {name}")
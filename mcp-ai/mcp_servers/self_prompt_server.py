@@ -4,10 +4,12 @@ Enhanced MCP STDIO server with self-prompting capabilities.
 """
 
 import asyncio
+import itertools
 import json
 import time
+from collections import OrderedDict, deque
 from typing import Any, Dict
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field, fields, is_dataclass, replace
 from datetime import datetime
 
 from mcp.server import Server
@@ -17,165 +19,237 @@ from mcp.types import (
     TextContent,
 )
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output
+    orjson = None
+
 # Create server instance
 server = Server("enhanced-stdio-server")
 
+def _json_default(obj):
+    """Values the encoder doesn't take natively: dataclasses (stdlib json) and other iterables."""
+    if is_dataclass(obj):
+        # Public fields only, matching orjson's dataclass output
+        return {f.name: getattr(obj, f.name) for f in fields(obj) if not f.name.startswith("_")}
+    if hasattr(obj, "__iter__"):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _dump(obj, indent: bool = True) -> str:
+    """Serialize a tool response as JSON text (2-space indent); dataclasses go in as-is."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_DATACLASS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_json_default, option=option).decode()
+    return json.dumps(obj, default=_json_default, indent=2 if indent else None)
+
+def _text_response(obj, indent: bool = True) -> list[TextContent]:
+    """Wrap a JSON-serializable tool result as the single text content block."""
+    return [TextContent(type="text", text=_dump(obj, indent))]
+
+def _plain_text(text: str) -> list[TextContent]:
+    """Wrap a plain message as a text content block."""
+    return [TextContent(type="text", text=text)]
+
 @dataclass
 class SelfPromptSession:
     session_id: str
     original_objective: str
     current_iteration: int
     max_iterations: int
-    conversation_history: list
+    conversation_history: deque  # bounded to max_iterations + 2 entries
     start_time: float
     last_progress_check: str
     confidence_scores: list
     status: str  # "active", "completed", "terminated"
+    # Cached token sets (not serialized): the objective, and (tokens, count) for the last few insights
+    _objective_tokens: frozenset = field(default=frozenset(), repr=False)
+    _recent_tokens: deque = field(default_factory=lambda: deque(maxlen=3), repr=False)
+    # Running confidence total so the average doesn't re-sum the scores
+    _confidence_total: float = field(default=0.0, repr=False)
 
-# Global state for self-prompting sessions
-active_sessions: Dict[str, SelfPromptSession] = {}
+# Global state for self-prompting sessions, least recently used first
+MAX_SESSIONS = 256
+active_sessions: "OrderedDict[str, SelfPromptSession]" = OrderedDict()
+_active_count = 0  # sessions with status == "active"
 
-@server.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available tools."""
-    return [
-        Tool(
-            name="sleep",
-            description="Pause execution for a given number of seconds",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "seconds": {
-                        "type": "integer",
-                        "description": "Number of seconds to sleep"
-                    }
+def _store_session(session: SelfPromptSession):
+    """Add a session, evicting the oldest finished one (or the oldest overall) past MAX_SESSIONS."""
+    global _active_count
+    old = active_sessions.pop(session.session_id, None)
+    if old is not None and old.status == "active":
+        _active_count -= 1
+    active_sessions[session.session_id] = session
+    if session.status == "active":
+        _active_count += 1
+    if len(active_sessions) > MAX_SESSIONS:
+        victim = next((sid for sid, s in active_sessions.items() if s.status != "active"), None)
+        if victim is None:
+            victim = next(iter(active_sessions))
+        if active_sessions.pop(victim).status == "active":
+            _active_count -= 1
+
+def _set_status(session: SelfPromptSession, status: str):
+    """Change a session's status, keeping _active_count in step."""
+    global _active_count
+    if session.status == "active" and status != "active":
+        _active_count -= 1
+    session.status = status
+
+# JSON Schema type names shared by the tool schemas below
+_OBJ = "object"
+_STR = "string"
+_INT = "integer"
+_NUM = "number"
+
+# Tool descriptors are static; built once at import
+_TOOLS: list[Tool] = [
+    Tool(
+        name="sleep",
+        description="Pause execution for a given number of seconds",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "seconds": {
+                    "type": _INT,
+                    "description": "Number of seconds to sleep"
+                }
+            },
+            "required": ["seconds"]
+        }
+    ),
+    Tool(
+        name="initiate_self_reasoning",
+        description="Start a self-prompting reasoning chain for complex tasks. Use only when task genuinely requires iterative analysis.",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "objective": {
+                    "type": _STR,
+                    "description": "The main objective or question to reason about"
                 },
-                "required": ["seconds"]
-            }
-        ),
-        Tool(
-            name="initiate_self_reasoning",
-            description="Start a self-prompting reasoning chain for complex tasks. Use only when task genuinely requires iterative analysis.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "objective": {
-                        "type": "string",
-                        "description": "The main objective or question to reason about"
-                    },
-                    "initial_context": {
-                        "type": "string",
-                        "description": "Initial information or context for the reasoning"
-                    },
-                    "max_iterations": {
-                        "type": "integer",
-                        "description": "Maximum number of reasoning iterations (default: 5, max: 8)",
-                        "default": 5
-                    },
-                    "confidence_threshold": {
-                        "type": "number",
-                        "description": "Minimum confidence score to continue (0.0-1.0, default: 0.6)",
-                        "default": 0.6
-                    }
+                "initial_context": {
+                    "type": _STR,
+                    "description": "Initial information or context for the reasoning"
                 },
-                "required": ["objective", "initial_context"]
-            }
-        ),
-        Tool(
-            name="continue_self_reasoning",
-            description="Continue an active self-reasoning chain with new insights",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "session_id": {
-                        "type": "string",
-                        "description": "ID of the active reasoning session"
-                    },
-                    "new_insight": {
-                        "type": "string",
-                        "description": "New insight or reasoning step"
-                    },
-                    "evidence": {
-                        "type": "string",
-                        "description": "Supporting evidence or data for this insight"
-                    },
-                    "confidence_score": {
-                        "type": "number",
-                        "description": "Confidence in this insight (0.0-1.0)"
-                    },
-                    "next_question": {
-                        "type": "string",
-                        "description": "Next question to explore, or 'COMPLETE' if objective is achieved"
-                    }
+                "max_iterations": {
+                    "type": _INT,
+                    "description": "Maximum number of reasoning iterations (default: 5, max: 8)",
+                    "default": 5
                 },
-                "required": ["session_id", "new_insight", "confidence_score"]
-            }
-        ),
-        Tool(
-            name="terminate_self_reasoning",
-            description="Terminate an active self-reasoning session",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "session_id": {
-                        "type": "string",
-                        "description": "ID of the session to terminate"
-                    },
-                    "reason": {
-                        "type": "string",
-                        "description": "Reason for termination"
-                    },
-                    "final_conclusion": {
-                        "type": "string",
-                        "description": "Final conclusion or summary"
-                    }
+                "confidence_threshold": {
+                    "type": _NUM,
+                    "description": "Minimum confidence score to continue (0.0-1.0, default: 0.6)",
+                    "default": 0.6
+                }
+            },
+            "required": ["objective", "initial_context"]
+        }
+    ),
+    Tool(
+        name="continue_self_reasoning",
+        description="Continue an active self-reasoning chain with new insights",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "session_id": {
+                    "type": _STR,
+                    "description": "ID of the active reasoning session"
                 },
-                "required": ["session_id", "reason"]
-            }
-        ),
-        Tool(
-            name="get_reasoning_status",
-            description="Check the status of active reasoning sessions",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "session_id": {
-                        "type": "string",
-                        "description": "Optional: specific session ID to check"
-                    }
+                "new_insight": {
+                    "type": _STR,
+                    "description": "New insight or reasoning step"
+                },
+                "evidence": {
+                    "type": _STR,
+                    "description": "Supporting evidence or data for this insight"
+                },
+                "confidence_score": {
+                    "type": _NUM,
+                    "description": "Confidence in this insight (0.0-1.0)"
+                },
+                "next_question": {
+                    "type": _STR,
+                    "description": "Next question to explore, or 'COMPLETE' if objective is achieved"
+                }
+            },
+            "required": ["session_id", "new_insight", "confidence_score"]
+        }
+    ),
+    Tool(
+        name="terminate_self_reasoning",
+        description="Terminate an active self-reasoning session",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "session_id": {
+                    "type": _STR,
+                    "description": "ID of the session to terminate"
+                },
+                "reason": {
+                    "type": _STR,
+                    "description": "Reason for termination"
+                },
+                "final_conclusion": {
+                    "type": _STR,
+                    "description": "Final conclusion or summary"
+                }
+            },
+            "required": ["session_id", "reason"]
+        }
+    ),
+    Tool(
+        name="get_reasoning_status",
+        description="Check the status of active reasoning sessions",
+        inputSchema={
+            "type": _OBJ,
+            "properties": {
+                "session_id": {
+                    "type": _STR,
+                    "description": "Optional: specific session ID to check"
                 }
             }
-        )
-    ]
+        }
+    )
+]
+
+@server.list_tools()
+async def list_tools() -> list[Tool]:
+    """List available tools."""
+    return _TOOLS
+
+# Session IDs: process start time + a counter, so back-to-back sessions never collide
+_proc_epoch = int(time.time())
+_session_counter = itertools.count(1)
 
 def generate_session_id() -> str:
     """Generate a unique session ID."""
-    return f"reasoning_{int(time.time() * 1000)}"
+    return f"reasoning_{_proc_epoch}_{next(_session_counter)}"
 
-def calculate_relevance_score(text: str, objective: str) -> float:
+def calculate_relevance_score(text_words: frozenset, objective_words: frozenset) -> float:
     """Simple relevance scoring (you could enhance this with NLP)."""
-    objective_words = set(objective.lower().split())
-    text_words = set(text.lower().split())
-    
     if not objective_words:
         return 0.0
     
     overlap = len(objective_words.intersection(text_words))
     return min(1.0, overlap / len(objective_words))
 
-def detect_repetition(history: list, new_insight: str) -> bool:
+def _format_history(history) -> list:
+    """History entries with their time.time() stamps rendered as ISO strings, for responses."""
+    return [
+        {**entry, "timestamp": datetime.fromtimestamp(entry["timestamp"]).isoformat()}
+        for entry in history
+    ]
+
+def detect_repetition(recent_tokens: deque, new_words: frozenset) -> bool:
     """Detect if the new insight is too similar to previous ones."""
-    if len(history) < 2:
-        return False
-    
-    recent_insights = [entry.get('insight', '') for entry in history[-3:]]
-    new_words = set(new_insight.lower().split())
-    
-    for insight in recent_insights:
-        insight_words = set(insight.lower().split())
-        overlap = len(new_words.intersection(insight_words))
-        similarity = overlap / max(len(new_words), len(insight_words), 1)
-        if similarity > 0.7:  # High similarity threshold
+    n_new = len(new_words)
+    for insight_words, n_old in recent_tokens:
+        denom = n_new if n_new >= n_old else n_old
+        if denom == 0:
+            denom = 1
+        # overlap / denom > 0.7 (high similarity threshold), in integers
+        if len(new_words.intersection(insight_words)) * 10 > 7 * denom:
             return True
     
     return False
@@ -189,36 +263,36 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
     if name == "sleep":
         seconds = arguments.get("seconds", 1)
         await asyncio.sleep(seconds)
-        return [TextContent(
-            type="text",
-            text=f"Slept for {seconds} seconds."
-        )]
+        return _plain_text(f"Slept for {seconds} seconds.")
 
     elif name == "initiate_self_reasoning":
         objective = arguments.get("objective", "")
         initial_context = arguments.get("initial_context", "")
-        max_iterations = min(arguments.get("max_iterations", 5), 8)  # Cap at 8
+        max_iterations = max(0, min(int(arguments.get("max_iterations", 5)), 8))  # Cap at 8; JSON numbers may be floats
         confidence_threshold = arguments.get("confidence_threshold", 0.6)
         
         session_id = generate_session_id()
+        now = time.time()
         
         session = SelfPromptSession(
             session_id=session_id,
             original_objective=objective,
             current_iteration=0,
             max_iterations=max_iterations,
-            conversation_history=[{
+            # initial context + one entry per iteration, incl. the one that hits the limit
+            conversation_history=deque([{
                 "iteration": 0,
                 "context": initial_context,
-                "timestamp": datetime.now().isoformat()
-            }],
-            start_time=time.time(),
+                "timestamp": now
+            }], maxlen=max_iterations + 2),
+            start_time=now,
             last_progress_check="initialized",
             confidence_scores=[],
-            status="active"
+            status="active",
+            _objective_tokens=frozenset(objective.lower().split())
         )
         
-        active_sessions[session_id] = session
+        _store_session(session)
         
         response = {
             "type": "reasoning_initiated",
@@ -229,10 +303,7 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
             "instructions": "Use 'continue_self_reasoning' to add insights and progress through the reasoning chain."
         }
         
-        return [TextContent(
-            type="text",
-            text=json.dumps(response, indent=2)
-        )]
+        return _text_response(response)
 
     elif name == "continue_self_reasoning":
         session_id = arguments.get("session_id", "")
@@ -242,40 +313,43 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
         next_question = arguments.get("next_question", "")
         
         if session_id not in active_sessions:
-            return [TextContent(
-                type="text",
-                text=json.dumps({"error": "Session not found or already terminated"})
-            )]
+            return _text_response({"error": "Session not found or already terminated"}, indent=False)
         
         session = active_sessions[session_id]
+        active_sessions.move_to_end(session_id)
         
         if session.status != "active":
-            return [TextContent(
-                type="text",
-                text=json.dumps({"error": f"Session is {session.status}, cannot continue"})
-            )]
+            return _text_response({"error": f"Session is {session.status}, cannot continue"}, indent=False)
         
         # Guardrails checks
         checks = []
+        is_complete = next_question.upper() == "COMPLETE"
         
         # 1. Iteration limit
-        if session.current_iteration >= session.max_iterations:
-            session.status = "terminated"
+        at_limit = session.current_iteration >= session.max_iterations
+        if at_limit:
+            _set_status(session, "terminated")
             checks.append("Maximum iterations reached")
         
-        # 2. Relevance check
-        relevance = calculate_relevance_score(new_insight, session.original_objective)
-        if relevance < 0.3:
-            checks.append(f"Low relevance to objective (score: {relevance:.2f})")
-        
-        # 3. Repetition check
-        if detect_repetition(session.conversation_history, new_insight):
-            checks.append("Repetitive insight detected")
+        # 2-3. Relevance and repetition only matter if the chain may go on
+        relevance = None
+        new_tokens = None
+        if not (at_limit or is_complete):
+            # Tokenize the insight once for both checks
+            new_tokens = frozenset(new_insight.lower().split())
+            relevance = calculate_relevance_score(new_tokens, session._objective_tokens)
+            if relevance < 0.3:
+                checks.append(f"Low relevance to objective (score: {relevance:.2f})")
+            
+            if detect_repetition(session._recent_tokens, new_tokens):
+                checks.append("Repetitive insight detected")
         
         # 4. Confidence degradation
-        session.confidence_scores.append(confidence_score)
-        if len(session.confidence_scores) >= 2:
-            recent_avg = sum(session.confidence_scores[-2:]) / 2
+        scores = session.confidence_scores
+        scores.append(confidence_score)
+        session._confidence_total += confidence_score
+        if len(scores) >= 2:
+            recent_avg = (scores[-2] + scores[-1]) / 2
             if recent_avg < 0.4:
                 checks.append(f"Low confidence trend (avg: {recent_avg:.2f})")
         
@@ -292,15 +366,17 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
             "evidence": evidence,
             "confidence": confidence_score,
             "next_question": next_question,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time(),
             "relevance_score": relevance
         })
+        if new_tokens is not None:
+            session._recent_tokens.append((new_tokens, len(new_tokens)))
         
         # Determine if should continue
-        should_terminate = bool(checks) or next_question.upper() == "COMPLETE"
+        should_terminate = bool(checks) or is_complete
         
         if should_terminate:
-            session.status = "completed" if next_question.upper() == "COMPLETE" else "terminated"
+            _set_status(session, "completed" if is_complete else "terminated")
             
             response = {
                 "type": "reasoning_completed",
@@ -309,8 +385,8 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
                 "total_iterations": session.current_iteration,
                 "final_insight": new_insight,
                 "termination_reasons": checks if checks else ["Objective completed"],
-                "conversation_summary": session.conversation_history,
-                "average_confidence": sum(session.confidence_scores) / len(session.confidence_scores) if session.confidence_scores else 0.0
+                "conversation_summary": _format_history(session.conversation_history),
+                "average_confidence": session._confidence_total / len(session.confidence_scores) if session.confidence_scores else 0.0
             }
         else:
             response = {
@@ -324,10 +400,7 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
                 "remaining_iterations": session.max_iterations - session.current_iteration
             }
         
-        return [TextContent(
-            type="text",
-            text=json.dumps(response, indent=2)
-        )]
+        return _text_response(response)
 
     elif name == "terminate_self_reasoning":
         session_id = arguments.get("session_id", "")
@@ -336,7 +409,7 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
         
         if session_id in active_sessions:
             session = active_sessions[session_id]
-            session.status = "terminated"
+            _set_status(session, "terminated")
             
             response = {
                 "type": "reasoning_terminated",
@@ -344,15 +417,12 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
                 "reason": reason,
                 "final_conclusion": final_conclusion,
                 "iterations_completed": session.current_iteration,
-                "summary": session.conversation_history
+                "summary": _format_history(session.conversation_history)
             }
         else:
             response = {"error": "Session not found"}
         
-        return [TextContent(
-            type="text",
-            text=json.dumps(response, indent=2)
-        )]
+        return _text_response(response)
 
     elif name == "get_reasoning_status":
         session_id = arguments.get("session_id")
@@ -361,22 +431,19 @@ async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextCon
             if session_id in active_sessions:
                 session = active_sessions[session_id]
                 response = {
-                    "session": asdict(session),
+                    "session": replace(session, conversation_history=_format_history(session.conversation_history)),
                     "elapsed_time": time.time() - session.start_time
                 }
             else:
                 response = {"error": "Session not found"}
         else:
             response = {
-                "active_sessions": len([s for s in active_sessions.values() if s.status == "active"]),
+                "active_sessions": _active_count,
                 "total_sessions": len(active_sessions),
                 "session_ids": list(active_sessions.keys())
             }
         
-        return [TextContent(
-            type="text",
-            text=json.dumps(response, indent=2)
-        )]
+        return _text_response(response)
 
     else:
         raise ValueError(f"Unknown tool: {name}")
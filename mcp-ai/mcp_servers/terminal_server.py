@@ -5,108 +5,448 @@ Enhanced Terminal Server with batch command approval
 
 import json
 import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
 import subprocess
 import os
+import secrets
+import shlex
+import signal
+import time
+import zlib
 from typing import Any, List
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
 import mcp.types as types
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output
+    orjson = None
+
 server = Server("terminal")
 
-# Store pending command batches
-pending_batches = {}
-batch_counter = 0
+# Responses go to a client, not a person: compact JSON unless MCP_PRETTY_JSON=1 (debugging)
+PRETTY_JSON = os.getenv("MCP_PRETTY_JSON") == "1"
 
-@server.list_tools()
-async def handle_list_tools() -> list[types.Tool]:
-    """List available terminal tools."""
-    return [
-        types.Tool(
-            name="execute_command",
-            description="Execute a single terminal command (will require approval)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "command": {
-                        "type": "string",
-                        "description": "The command to execute"
-                    },
-                    "description": {
-                        "type": "string", 
-                        "description": "Human-readable description of what this command does"
-                    },
-                    "working_directory": {
-                        "type": "string",
-                        "description": "Working directory for the command (optional)",
-                        "default": ""
-                    }
+def _dump(obj) -> str:
+    """Serialize a tool response as JSON text."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if PRETTY_JSON else 0).decode()
+    if PRETTY_JSON:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(',', ':'))
+
+# Batches aren't stored server-side: the batch_id *is* the batch, compressed and signed
+# with a per-process key, so execute only accepts ids this server issued (until they expire)
+BATCH_KEY = secrets.token_bytes(32)
+BATCH_TTL_SECONDS = 900
+_MAC_LEN = hashlib.sha256().digest_size
+# MACs of batches already executed -> when their token expires anyway; each approval runs once
+_spent_macs: dict[bytes, float] = {}
+
+def _encode_batch(batch: dict) -> str:
+    """Pack a batch into a signed, url-safe batch_id."""
+    payload = zlib.compress(
+        orjson.dumps(batch) if orjson is not None else json.dumps(batch, separators=(',', ':')).encode()
+    )
+    mac = hmac.new(BATCH_KEY, payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(mac + payload).decode()
+
+def _decode_batch(batch_id: str):
+    """Verify and unpack a batch_id; None if it is forged, corrupt or expired."""
+    try:
+        raw = base64.urlsafe_b64decode(batch_id.encode())
+    except (binascii.Error, ValueError):
+        return None
+    mac, payload = raw[:_MAC_LEN], raw[_MAC_LEN:]
+    if not hmac.compare_digest(mac, hmac.new(BATCH_KEY, payload, hashlib.sha256).digest()):
+        return None
+    batch = json.loads(zlib.decompress(payload))
+    if time.time() - batch["created_at"] > BATCH_TTL_SECONDS:
+        return None
+    return batch
+
+def _spend_batch(batch_id: str):
+    """Decode a batch_id and mark it used; None if it is invalid, expired or already executed."""
+    batch = _decode_batch(batch_id)
+    if batch is None:
+        return None
+    now = time.time()
+    for mac in [m for m, expires in _spent_macs.items() if expires < now]:
+        del _spent_macs[mac]
+    mac = base64.urlsafe_b64decode(batch_id.encode())[:_MAC_LEN]
+    if mac in _spent_macs:
+        return None
+    _spent_macs[mac] = batch["created_at"] + BATCH_TTL_SECONDS
+    return batch
+
+# Upper bound on commands running at once for batches prepared with parallel=true
+MAX_PARALLEL_COMMANDS = int(os.getenv("TERMINAL_MAX_PARALLEL", "4"))
+# Per-stream cap on captured stdout/stderr; the rest is read and discarded
+MAX_OUTPUT_BYTES = int(os.getenv("TERMINAL_MAX_OUTPUT", str(1 << 20)))
+# Seconds an approved command may run before its process group is killed (0 = no limit)
+CMD_TIMEOUT = float(os.getenv("TERMINAL_CMD_TIMEOUT", "300")) or None
+
+# Commands run in child processes, so the server's own cwd never changes; read it once
+_CWD_CACHE = os.getcwd()
+
+async def _read_capped(stream, limit: int) -> tuple[bytes, bool]:
+    """Read a pipe to EOF keeping at most `limit` bytes; returns (data, truncated)."""
+    chunks, size = [], 0
+    while size < limit:
+        chunk = await stream.read(limit - size)
+        if not chunk:
+            return b"".join(chunks), False
+        chunks.append(chunk)
+        size += len(chunk)
+    # Keep draining so the child never blocks on a full pipe
+    truncated = False
+    while await stream.read(1 << 16):
+        truncated = True
+    return b"".join(chunks), truncated
+
+def _kill_group(process):
+    """SIGKILL a process and everything it started (it leads its own session on POSIX)."""
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+class _FramedReader:
+    """Split one pipe of a long-lived shell into per-command frames ending at a marker line."""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = bytearray()
+    
+    async def read_frame(self, marker: bytes, limit: int) -> tuple[bytes, bool, Any]:
+        """Read up to `marker` + rest of its line; returns (data, truncated, trailer or None at EOF)."""
+        kept = bytearray()
+        truncated = False
+        
+        def keep(data):
+            nonlocal truncated
+            room = limit - len(kept)
+            if len(data) > room:
+                truncated = True
+            kept.extend(data[:max(room, 0)])
+        
+        while True:
+            i = self.buf.find(marker)
+            if i != -1:
+                j = self.buf.find(b"\n", i + len(marker))
+                if j != -1:
+                    keep(self.buf[:i])
+                    trailer = bytes(self.buf[i + len(marker):j])
+                    del self.buf[:j + 1]
+                    return bytes(kept), truncated, trailer
+            else:
+                # Everything but a possible partial marker at the end is command output
+                cut = len(self.buf) - len(marker) + 1
+                if cut > 0:
+                    keep(self.buf[:cut])
+                    del self.buf[:cut]
+            chunk = await self.stream.read(1 << 16)
+            if not chunk:
+                keep(self.buf)
+                self.buf.clear()
+                return bytes(kept), truncated, None
+            self.buf += chunk
+
+async def _run_batch_in_shell(indices: list, commands: list) -> list:
+    """Run approved commands in order through one /bin/sh instead of a new shell per command.
+    
+    Each command is passed quoted to eval in a ( ) subshell with stdin from /dev/null, so stray
+    quotes/parens are a syntax error rather than breaking out of the framing, and cd/exit/env
+    changes and stdin reads can't leak into the next command. Output is framed by a random
+    per-batch marker. If the shell dies, a fresh one is started for the remaining commands.
+    """
+    nonce = secrets.token_hex(8)
+    process = out = err = None
+    results = []
+    
+    async def _spawn():
+        nonlocal process, out, err
+        process = await asyncio.create_subprocess_exec(
+            "/bin/sh",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,  # so a timeout can kill the shell and its children together
+        )
+        out, err = _FramedReader(process.stdout), _FramedReader(process.stderr)
+    
+    try:
+        for n, index in enumerate(indices):
+            if index < 1 or index > len(commands):
+                results.append({
+                    "index": index,
+                    "error": "Invalid command index"
+                })
+                continue
+            
+            cmd = commands[index - 1]  # Convert to 0-based
+            command = cmd.get("command", "")
+            working_dir = cmd.get("working_directory", "") or _CWD_CACHE
+            description = cmd.get("description", "")
+            
+            # stat off the event loop: a hung network mount shouldn't stall other tool calls
+            if not await asyncio.to_thread(os.path.isdir, working_dir):
+                results.append({
+                    "index": index,
+                    "command": command,
+                    "error": f"Working directory not found: {working_dir}",
+                    "success": False
+                })
+                continue
+            
+            try:
+                if process is None:
+                    await _spawn()
+                
+                marker = f"__MCP_{nonce}_{n}__"
+                script = (
+                    f"cd {shlex.quote(working_dir)} && ( eval {shlex.quote(command)} ) </dev/null\n"
+                    f"printf '\\n{marker}:%s\\n' \"$?\"\n"
+                    f"printf '\\n{marker}\\n' >&2\n"
+                )
+                process.stdin.write(script.encode())
+                await process.stdin.drain()
+                
+                frame = b"\n" + marker.encode()
+                try:
+                    (stdout, out_cut, status), (stderr, err_cut, _) = await asyncio.wait_for(
+                        asyncio.gather(
+                            out.read_frame(frame + b":", MAX_OUTPUT_BYTES),
+                            err.read_frame(frame, MAX_OUTPUT_BYTES),
+                        ),
+                        timeout=CMD_TIMEOUT,
+                    )
+                except asyncio.TimeoutError:
+                    # Kill the shell with whatever the command started; the next one gets a fresh shell
+                    _kill_group(process)
+                    return_code = await process.wait()
+                    process = None
+                    results.append({
+                        "index": index,
+                        "command": command,
+                        "description": description,
+                        "working_directory": working_dir,
+                        "return_code": return_code,
+                        "error": f"Timed out after {CMD_TIMEOUT:g}s",
+                        "timed_out": True,
+                        "success": False
+                    })
+                    continue
+                
+                if status is None:
+                    # The shell itself exited; report its status and start over for the rest
+                    return_code = await process.wait()
+                    process = None
+                else:
+                    return_code = int(status)
+                
+                results.append({
+                    "index": index,
+                    "command": command,
+                    "description": description,
+                    "working_directory": working_dir,
+                    "return_code": return_code,
+                    "stdout": stdout.decode('utf-8', errors='replace') if stdout else "",
+                    "stderr": stderr.decode('utf-8', errors='replace') if stderr else "",
+                    "truncated": out_cut or err_cut,
+                    "timed_out": False,
+                    "success": return_code == 0
+                })
+                
+            except Exception as e:
+                results.append({
+                    "index": index,
+                    "command": command,
+                    "error": str(e),
+                    "success": False
+                })
+                if process is not None and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                process = None
+    finally:
+        if process is not None and process.returncode is None:
+            process.stdin.close()
+            await process.wait()
+    
+    return results
+
+# Tool descriptors are static; built once at import
+_TOOLS: list[types.Tool] = [
+    types.Tool(
+        name="execute_command",
+        description="Execute a single terminal command (will require approval)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "command": {
+                    "type": "string",
+                    "description": "The command to execute"
                 },
-                "required": ["command"]
-            }
-        ),
-        types.Tool(
-            name="prepare_command_batch",
-            description="Prepare a batch of commands for approval before execution",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "commands": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "command": {"type": "string"},
-                                "description": {"type": "string"},
-                                "working_directory": {"type": "string", "default": ""}
-                            },
-                            "required": ["command", "description"]
+                "description": {
+                    "type": "string", 
+                    "description": "Human-readable description of what this command does"
+                },
+                "working_directory": {
+                    "type": "string",
+                    "description": "Working directory for the command (optional)",
+                    "default": ""
+                }
+            },
+            "required": ["command"]
+        }
+    ),
+    types.Tool(
+        name="prepare_command_batch",
+        description="Prepare a batch of commands for approval before execution",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "commands": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "command": {"type": "string"},
+                            "description": {"type": "string"},
+                            "working_directory": {"type": "string", "default": ""}
                         },
-                        "description": "List of commands with descriptions"
+                        "required": ["command", "description"]
                     },
-                    "batch_description": {
-                        "type": "string",
-                        "description": "Overall description of what this batch accomplishes"
-                    }
+                    "description": "List of commands with descriptions"
                 },
-                "required": ["commands", "batch_description"]
-            }
-        ),
-        types.Tool(
-            name="execute_approved_batch",
-            description="Execute a previously approved command batch",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "batch_id": {
-                        "type": "string",
-                        "description": "ID of the approved batch to execute"
-                    },
-                    "approved_indices": {
-                        "type": "array",
-                        "items": {"type": "integer"},
-                        "description": "List of command indices that were approved (1-based)"
-                    }
+                "batch_description": {
+                    "type": "string",
+                    "description": "Overall description of what this batch accomplishes"
                 },
-                "required": ["batch_id", "approved_indices"]
-            }
-        ),
-        types.Tool(
-            name="get_current_directory",
-            description="Get the current working directory",
-            inputSchema={
-                "type": "object",
-                "properties": {}
-            }
+                "parallel": {
+                    "type": "boolean",
+                    "description": "Run approved commands concurrently; only for commands that don't depend on each other",
+                    "default": False
+                }
+            },
+            "required": ["commands", "batch_description"]
+        }
+    ),
+    types.Tool(
+        name="execute_approved_batch",
+        description="Execute a previously approved command batch",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "batch_id": {
+                    "type": "string",
+                    "description": "ID of the approved batch to execute"
+                },
+                "approved_indices": {
+                    "type": "array",
+                    "items": {"type": "integer"},
+                    "description": "List of command indices that were approved (1-based)"
+                }
+            },
+            "required": ["batch_id", "approved_indices"]
+        }
+    ),
+    types.Tool(
+        name="get_current_directory",
+        description="Get the current working directory",
+        inputSchema={
+            "type": "object",
+            "properties": {}
+        }
+    )
+]
+
+@server.list_tools()
+async def handle_list_tools() -> list[types.Tool]:
+    """List available terminal tools."""
+    return _TOOLS
+
+async def _run_one(index: int, commands: list) -> dict:
+    """Run one approved command of a batch and return its result entry."""
+    if index < 1 or index > len(commands):
+        return {
+            "index": index,
+            "error": "Invalid command index"
+        }
+    
+    cmd = commands[index - 1]  # Convert to 0-based
+    command = cmd.get("command", "")
+    working_dir = cmd.get("working_directory", "") or _CWD_CACHE
+    description = cmd.get("description", "")
+    
+    try:
+        # Execute the command
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.DEVNULL,  # never read the MCP protocol pipe
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=working_dir,
+            start_new_session=True  # own process group, killed as a whole on timeout
         )
-    ]
+        
+        async def _communicate():
+            outputs = await asyncio.gather(
+                _read_capped(process.stdout, MAX_OUTPUT_BYTES),
+                _read_capped(process.stderr, MAX_OUTPUT_BYTES),
+            )
+            await process.wait()
+            return outputs
+        
+        try:
+            (stdout, out_cut), (stderr, err_cut) = await asyncio.wait_for(_communicate(), timeout=CMD_TIMEOUT)
+        except asyncio.TimeoutError:
+            _kill_group(process)
+            await process.wait()
+            return {
+                "index": index,
+                "command": command,
+                "description": description,
+                "working_directory": working_dir,
+                "return_code": process.returncode,
+                "error": f"Timed out after {CMD_TIMEOUT:g}s",
+                "timed_out": True,
+                "success": False
+            }
+        
+        return {
+            "index": index,
+            "command": command,
+            "description": description,
+            "working_directory": working_dir,
+            "return_code": process.returncode,
+            "stdout": stdout.decode('utf-8', errors='replace') if stdout else "",
+            "stderr": stderr.decode('utf-8', errors='replace') if stderr else "",
+            "truncated": out_cut or err_cut,
+            "timed_out": False,
+            "success": process.returncode == 0
+        }
+        
+    except Exception as e:
+        return {
+            "index": index,
+            "command": command,
+            "error": str(e),
+            "success": False
+        }
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.TextContent]:
     """Handle terminal tool calls."""
-    global batch_counter
-    
     if name == "execute_command":
         command = arguments.get("command", "")
         description = arguments.get("description", command)
@@ -129,22 +469,20 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
         
         return [types.TextContent(
             type="text",
-            text=json.dumps(approval_request, indent=2)
+            text=_dump(approval_request)
         )]
     
     elif name == "prepare_command_batch":
         commands = arguments.get("commands", [])
         batch_description = arguments.get("batch_description", "")
         
-        batch_counter += 1
-        batch_id = f"batch_{batch_counter}"
-        
-        # Store the batch for later execution
-        pending_batches[batch_id] = {
+        # The batch travels inside its id; nothing is kept here until execution
+        batch_id = _encode_batch({
             "commands": commands,
             "batch_description": batch_description,
-            "created_at": "now"  # You might want to use actual timestamp
-        }
+            "parallel": bool(arguments.get("parallel", False)),
+            "created_at": time.time()
+        })
         
         # Prepare approval request
         approval_request = {
@@ -166,96 +504,73 @@ async def handle_call_tool(name: str, arguments: dict[str, Any]) -> list[types.T
         
         return [types.TextContent(
             type="text",
-            text=json.dumps(approval_request, indent=2)
+            text=_dump(approval_request)
         )]
     
     elif name == "execute_approved_batch":
         batch_id = arguments.get("batch_id", "")
         approved_indices = arguments.get("approved_indices", [])
         
-        if batch_id not in pending_batches:
+        if not isinstance(batch_id, str):
+            return [types.TextContent(
+                type="text",
+                text="Error: batch_id must be a string"
+            )]
+        
+        # Marked spent before anything runs, so a replayed id is refused
+        batch = _spend_batch(batch_id)
+        if batch is None:
             return [types.TextContent(
                 type="text", 
-                text=f"Error: Batch {batch_id} not found or expired"
+                text="Error: Batch is invalid, expired or already executed"
             )]
         
-        batch = pending_batches[batch_id]
         commands = batch["commands"]
         
-        results = []
-        for i, index in enumerate(approved_indices):
-            if index < 1 or index > len(commands):
-                results.append({
-                    "index": index,
-                    "error": "Invalid command index"
-                })
-                continue
+        # All results go back as one TextContent, i.e. a single JSON-RPC frame on stdout
+        # (stdio_server writes and flushes each message once), however many commands ran
+        if batch.get("parallel") or os.name != "posix":
+            limit = asyncio.Semaphore(MAX_PARALLEL_COMMANDS if batch.get("parallel") else 1)
             
-            cmd = commands[index - 1]  # Convert to 0-based
-            command = cmd.get("command", "")
-            working_dir = cmd.get("working_directory", "") or os.getcwd()
-            description = cmd.get("description", "")
+            async def _limited(index):
+                async with limit:
+                    return await _run_one(index, commands)
             
-            try:
-                # Execute the command
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=working_dir
-                )
-                
-                stdout, stderr = await process.communicate()
-                
-                result = {
-                    "index": index,
-                    "command": command,
-                    "description": description,
-                    "working_directory": working_dir,
-                    "return_code": process.returncode,
-                    "stdout": stdout.decode('utf-8') if stdout else "",
-                    "stderr": stderr.decode('utf-8') if stderr else "",
-                    "success": process.returncode == 0
-                }
-                
-                results.append(result)
-                
-            except Exception as e:
-                results.append({
-                    "index": index,
-                    "command": command,
-                    "error": str(e),
-                    "success": False
-                })
-        
-        # Clean up the batch
-        del pending_batches[batch_id]
+            # gather keeps results in approval order
+            results = await asyncio.gather(*(_limited(index) for index in approved_indices))
+        else:
+            # Sequential batch: one shell for all commands, in approval order
+            results = await _run_batch_in_shell(approved_indices, commands)
         
         return [types.TextContent(
             type="text",
-            text=json.dumps({
+            text=_dump({
                 "batch_id": batch_id,
                 "batch_description": batch["batch_description"],
                 "executed_commands": len(results),
                 "results": results
-            }, indent=2)
+            })
         )]
     
     elif name == "get_current_directory":
         try:
-            cwd = os.getcwd()
+            cwd = _CWD_CACHE
+            exists, is_directory = await asyncio.gather(
+                asyncio.to_thread(os.path.exists, cwd),
+                asyncio.to_thread(os.path.isdir, cwd),
+            )
             return [types.TextContent(
                 type="text",
-                text=json.dumps({
+                text=_dump({
                     "current_directory": cwd,
-                    "exists": os.path.exists(cwd),
-                    "is_directory": os.path.isdir(cwd)
+                    "exists": exists,
+                    "is_directory": is_directory
                 })
             )]
         except Exception as e:
             return [types.TextContent(
                 type="text",
-                text=json.dumps({
+                text=_dump({
                     "error": str(e)
                 })
             )]
@@ -6,12 +6,22 @@ Provides tools for managing simulated cryptocurrency trades with realistic featu
 
 import asyncio
 import csv
+import heapq
+import itertools
 import json
 import os
+import time
+from operator import itemgetter
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
-import uuid
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same file layout
+    orjson = None
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -25,6 +35,7 @@ from mcp.types import (
 server = Server("trading-engine")
 
 # Configuration
+PRETTY_JSON = os.getenv("MCP_PRETTY_JSON") == "1"  # indent balance.json for debugging
 TRADES_CSV = "trades_history.csv"
 BALANCE_FILE = "balance.json"
 INITIAL_BALANCE = 1000.0  # USDT
@@ -38,6 +49,20 @@ CSV_HEADERS = [
     "exit_timestamp", "pnl", "commission", "notes"
 ]
 
+# "YYYY-MM-DDTHH:MM:SS" of the current second, reformatted only when the second changes
+_LAST_SEC = 0
+_LAST_PREFIX = ""
+
+def _now_iso() -> str:
+    """UTC timestamp in datetime.isoformat() form, always with microseconds"""
+    global _LAST_SEC, _LAST_PREFIX
+    nsec = time.time_ns()
+    sec, frac = divmod(nsec, 1_000_000_000)
+    if sec != _LAST_SEC:
+        _LAST_PREFIX = datetime.fromtimestamp(sec, timezone.utc).isoformat()[:19]
+        _LAST_SEC = sec
+    return f"{_LAST_PREFIX}.{frac // 1000:06d}+00:00"
+
 def ensure_files_exist():
     """Initialize required files if they don't exist"""
     # Initialize trades CSV
@@ -55,161 +80,281 @@ def ensure_files_exist():
             "unrealized_pnl": 0.0,
             "total_trades": 0,
             "winning_trades": 0,
-            "last_updated": datetime.now(timezone.utc).isoformat()
+            "last_updated": _now_iso()
         }
-        with open(BALANCE_FILE, 'w') as f:
-            json.dump(balance_data, f, indent=2)
+        _write_balance(balance_data)
+
+# Balance is read from disk once and then kept in memory; save_balance writes it through
+_BALANCE: Optional[Dict] = None
+
+def _write_balance(balance_data: Dict):
+    """Atomically replace the balance file"""
+    tmp = BALANCE_FILE + ".tmp"
+    if orjson is not None:
+        with open(tmp, 'wb') as f:
+            f.write(orjson.dumps(balance_data, option=orjson.OPT_INDENT_2 if PRETTY_JSON else 0))
+    else:
+        with open(tmp, 'w') as f:
+            if PRETTY_JSON:
+                json.dump(balance_data, f, indent=2)
+            else:
+                json.dump(balance_data, f, separators=(',', ':'))
+    os.replace(tmp, BALANCE_FILE)
 
 def load_balance() -> Dict:
-    """Load current balance information"""
-    with open(BALANCE_FILE, 'r') as f:
-        return json.load(f)
+    """Load current balance information (cached; callers mutate it and then save_balance)"""
+    global _BALANCE
+    if _BALANCE is None:
+        if orjson is not None:
+            with open(BALANCE_FILE, 'rb') as f:
+                _BALANCE = orjson.loads(f.read())
+        else:
+            with open(BALANCE_FILE, 'r') as f:
+                _BALANCE = json.load(f)
+    return _BALANCE
 
 def save_balance(balance_data: Dict):
     """Save balance information"""
-    balance_data["last_updated"] = datetime.now(timezone.utc).isoformat()
-    with open(BALANCE_FILE, 'w') as f:
-        json.dump(balance_data, f, indent=2)
+    global _BALANCE
+    balance_data["last_updated"] = _now_iso()
+    _BALANCE = balance_data
+    _write_balance(balance_data)
 
 def calculate_position_size(order_value: float, leverage: float) -> tuple:
     """Calculate margin required and position size"""
     margin_required = order_value / leverage if leverage > 1 else order_value
     return margin_required, order_value
 
-def get_open_trades() -> List[Dict]:
-    """Get all open trades from CSV"""
-    trades = []
-    try:
-        with open(TRADES_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['status'] == 'open':
-                    trades.append(row)
-    except FileNotFoundError:
-        pass
-    return trades
+# In-memory index of the trades CSV, loaded once: trade_id -> latest row (all values as str).
+# The CSV is an append-only journal: a closed trade is appended again with its new fields
+# and the last row for a trade_id wins. It's compacted once it has 2x more rows than trades.
+TRADES: Dict[str, Dict] = {}
+# The open subset of TRADES, kept in step by append_trade so nothing has to scan for it
+OPEN_TRADES: List[Dict] = []
+_trades_loaded = False
+_journal_rows = 0
 
-def update_trade_in_csv(trade_id: str, updates: Dict):
-    """Update a specific trade in CSV"""
-    trades = []
-    with open(TRADES_CSV, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['trade_id'] == trade_id:
-                row.update(updates)
-            trades.append(row)
-    
-    with open(TRADES_CSV, 'w', newline='') as f:
+def _as_row(trade: Dict) -> Dict:
+    """Normalize a trade dict to what csv.DictReader would give back."""
+    return {h: "" if trade.get(h) is None else str(trade.get(h)) for h in CSV_HEADERS}
+
+def load_trades() -> Dict[str, Dict]:
+    """Return the trade index, reading the CSV journal on first use"""
+    global _trades_loaded, _journal_rows
+    if not _trades_loaded:
+        TRADES.clear()
+        _journal_rows = 0
+        try:
+            with open(TRADES_CSV, 'r', newline='') as f:
+                for row in csv.DictReader(f):
+                    TRADES[row['trade_id']] = row
+                    _journal_rows += 1
+        except FileNotFoundError:
+            pass
+        OPEN_TRADES[:] = [t for t in TRADES.values() if t['status'] == 'open']
+        _trades_loaded = True
+    return TRADES
+
+def _compact_trades():
+    """Rewrite the journal with one row per trade"""
+    global _journal_rows
+    tmp = TRADES_CSV + ".tmp"
+    with open(tmp, 'w', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
         writer.writeheader()
-        writer.writerows(trades)
+        writer.writerows(TRADES.values())
+    os.replace(tmp, TRADES_CSV)
+    _journal_rows = len(TRADES)
+
+def append_trade(trade: Dict) -> Dict:
+    """Record a trade row (new or updated) in the index and append it to the journal"""
+    global _journal_rows, _columns
+    trades = load_trades()
+    row = _as_row(trade)
+    prev = trades.get(row['trade_id'])
+    trades[row['trade_id']] = row
+    if prev is not None and prev['status'] == 'open':
+        OPEN_TRADES.remove(prev)
+    if row['status'] == 'open':
+        OPEN_TRADES.append(row)
+    _columns = None
+    with open(TRADES_CSV, 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=CSV_HEADERS).writerow(row)
+    _journal_rows += 1
+    if _journal_rows > 2 * len(trades):
+        _compact_trades()
+    return row
+
+# Columnar (SoA) view of TRADES for vectorized filters and maths; rebuilt lazily after a write
+_columns: Optional[Dict[str, Any]] = None
+
+def _float_column(rows: List[Dict], key: str) -> np.ndarray:
+    return np.fromiter((float(r[key]) if r[key] else np.nan for r in rows), dtype=np.float64, count=len(rows))
+
+def trade_columns() -> Dict[str, Any]:
+    """Trades as parallel arrays: "rows" (the row dicts) plus one array per field"""
+    global _columns
+    if _columns is None:
+        rows = list(load_trades().values())
+        _columns = {
+            "rows": rows,
+            "token": np.array([r['token'] for r in rows], dtype=object),
+            "direction": np.array([r['direction'] for r in rows], dtype=object),
+            "status": np.array([r['status'] for r in rows], dtype=object),
+            "entry_price": _float_column(rows, 'entry_price'),
+            "quantity": _float_column(rows, 'quantity'),
+            "leverage": _float_column(rows, 'leverage'),
+            "margin_used": _float_column(rows, 'margin_used'),
+        }
+    return _columns
+
+# trade_id sequence (8+ hex digits), started past both the clock and every id already on disk
+_TRADE_SEQ: Optional[Iterator[int]] = None
+
+def _new_trade_id() -> str:
+    """Next trade id; unique across restarts without a UUID per trade"""
+    global _TRADE_SEQ
+    if _TRADE_SEQ is None:
+        start = int(time.time())
+        for trade_id in load_trades():
+            try:
+                start = max(start, int(trade_id, 16) + 1)
+            except ValueError:
+                pass
+        _TRADE_SEQ = itertools.count(start)
+    return f"{next(_TRADE_SEQ):08x}"
+
+def get_open_trades() -> List[Dict]:
+    """Get all open trades (the shared OPEN_TRADES list; don't modify it)"""
+    load_trades()
+    return OPEN_TRADES
+
+def update_trade_in_csv(trade_id: str, updates: Dict):
+    """Update a specific trade (appends the updated row to the journal)"""
+    trade = dict(load_trades()[trade_id])
+    trade.update(updates)
+    append_trade(trade)
+
+# File I/O runs in worker threads; tool calls are serialized so they never see TRADES or
+# the balance half-updated while a thread is writing
+_state_lock = asyncio.Lock()
+
+def _load_state():
+    """Create missing files and load trades and balance (disk is only read the first time)"""
+    ensure_files_exist()
+    load_balance()
+    load_trades()
+
+# Tool descriptors are static; built once at import
+_TOOLS: List[Tool] = [
+    Tool(
+        name="execute_trade",
+        description="Execute a new trade (open position)",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "token": {"type": "string", "description": "Token symbol (e.g., BTC, ETH)"},
+                "direction": {"type": "string", "enum": ["long", "short"], "description": "Trade direction"},
+                "entry_price": {"type": "number", "description": "Entry price in USDT"},
+                "order_value": {"type": "number", "default": DEFAULT_ORDER_SIZE, "description": "Order value in USDT"},
+                "leverage": {"type": "number", "default": 1.0, "description": "Leverage multiplier (1.0 = no leverage)"},
+                "notes": {"type": "string", "description": "Optional trade notes"}
+            },
+            "required": ["token", "direction", "entry_price"]
+        }
+    ),
+    Tool(
+        name="close_trade",
+        description="Close an existing trade",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "trade_id": {"type": "string", "description": "Trade ID to close"},
+                "exit_price": {"type": "number", "description": "Exit price in USDT"},
+                "notes": {"type": "string", "description": "Optional closing notes"}
+            },
+            "required": ["trade_id", "exit_price"]
+        }
+    ),
+    Tool(
+        name="get_portfolio_status",
+        description="Get current portfolio balance and open positions",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+            "required": []
+        }
+    ),
+    Tool(
+        name="get_trade_history",
+        description="Get trade history with optional filters",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "status": {"type": "string", "enum": ["open", "closed", "all"], "default": "all"},
+                "token": {"type": "string", "description": "Filter by specific token"},
+                "limit": {"type": "integer", "default": 50, "description": "Limit number of results"}
+            },
+            "required": []
+        }
+    ),
+    Tool(
+        name="calculate_pnl",
+        description="Calculate unrealized PnL for open positions given current prices",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "current_prices": {
+                    "type": "object",
+                    "description": "Current prices as {token: price} pairs",
+                    "additionalProperties": {"type": "number"}
+                }
+            },
+            "required": ["current_prices"]
+        }
+    ),
+    Tool(
+        name="get_risk_metrics",
+        description="Get risk metrics and position sizing recommendations",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "proposed_order_value": {"type": "number", "description": "Proposed order value to check"},
+                "leverage": {"type": "number", "default": 1.0, "description": "Proposed leverage"}
+            },
+            "required": []
+        }
+    )
+]
 
 @server.list_tools()
 async def list_tools() -> List[Tool]:
     """List available trading tools"""
-    return [
-        Tool(
-            name="execute_trade",
-            description="Execute a new trade (open position)",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "token": {"type": "string", "description": "Token symbol (e.g., BTC, ETH)"},
-                    "direction": {"type": "string", "enum": ["long", "short"], "description": "Trade direction"},
-                    "entry_price": {"type": "number", "description": "Entry price in USDT"},
-                    "order_value": {"type": "number", "default": DEFAULT_ORDER_SIZE, "description": "Order value in USDT"},
-                    "leverage": {"type": "number", "default": 1.0, "description": "Leverage multiplier (1.0 = no leverage)"},
-                    "notes": {"type": "string", "description": "Optional trade notes"}
-                },
-                "required": ["token", "direction", "entry_price"]
-            }
-        ),
-        Tool(
-            name="close_trade",
-            description="Close an existing trade",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "trade_id": {"type": "string", "description": "Trade ID to close"},
-                    "exit_price": {"type": "number", "description": "Exit price in USDT"},
-                    "notes": {"type": "string", "description": "Optional closing notes"}
-                },
-                "required": ["trade_id", "exit_price"]
-            }
-        ),
-        Tool(
-            name="get_portfolio_status",
-            description="Get current portfolio balance and open positions",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        ),
-        Tool(
-            name="get_trade_history",
-            description="Get trade history with optional filters",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "status": {"type": "string", "enum": ["open", "closed", "all"], "default": "all"},
-                    "token": {"type": "string", "description": "Filter by specific token"},
-                    "limit": {"type": "integer", "default": 50, "description": "Limit number of results"}
-                },
-                "required": []
-            }
-        ),
-        Tool(
-            name="calculate_pnl",
-            description="Calculate unrealized PnL for open positions given current prices",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "current_prices": {
-                        "type": "object",
-                        "description": "Current prices as {token: price} pairs",
-                        "additionalProperties": {"type": "number"}
-                    }
-                },
-                "required": ["current_prices"]
-            }
-        ),
-        Tool(
-            name="get_risk_metrics",
-            description="Get risk metrics and position sizing recommendations",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "proposed_order_value": {"type": "number", "description": "Proposed order value to check"},
-                    "leverage": {"type": "number", "default": 1.0, "description": "Proposed leverage"}
-                },
-                "required": []
-            }
-        )
-    ]
+    return _TOOLS
 
 @server.call_tool()
 async def call_tool(name: str, arguments: Dict[str, Any] | None) -> List[TextContent]:
     """Handle tool calls"""
-    ensure_files_exist()
-    
     if arguments is None:
         arguments = {}
     
-    if name == "execute_trade":
-        return await execute_trade(arguments)
-    elif name == "close_trade":
-        return await close_trade(arguments)
-    elif name == "get_portfolio_status":
-        return await get_portfolio_status(arguments)
-    elif name == "get_trade_history":
-        return await get_trade_history(arguments)
-    elif name == "calculate_pnl":
-        return await calculate_pnl(arguments)
-    elif name == "get_risk_metrics":
-        return await get_risk_metrics(arguments)
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+    async with _state_lock:
+        await asyncio.to_thread(_load_state)
+        
+        if name == "execute_trade":
+            return await execute_trade(arguments)
+        elif name == "close_trade":
+            return await close_trade(arguments)
+        elif name == "get_portfolio_status":
+            return await get_portfolio_status(arguments)
+        elif name == "get_trade_history":
+            return await get_trade_history(arguments)
+        elif name == "calculate_pnl":
+            return await calculate_pnl(arguments)
+        elif name == "get_risk_metrics":
+            return await get_risk_metrics(arguments)
+        else:
+            raise ValueError(f"Unknown tool: {name}")
 
 async def execute_trade(args: Dict) -> List[TextContent]:
     """Execute a new trade"""
@@ -236,26 +381,24 @@ async def execute_trade(args: Dict) -> List[TextContent]:
         )]
     
     # Generate trade ID
-    trade_id = str(uuid.uuid4())[:8]
-    timestamp = datetime.now(timezone.utc).isoformat()
+    trade_id = _new_trade_id()
+    timestamp = _now_iso()
     
     # Create trade record
-    trade_data = [
+    trade_data = dict(zip(CSV_HEADERS, [
         trade_id, timestamp, token, direction, entry_price,
         quantity, leverage, margin_required, "open", "", 
         "", "", commission, notes
-    ]
+    ]))
     
-    # Write to CSV
-    with open(TRADES_CSV, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(trade_data)
+    # Write to the journal
+    await asyncio.to_thread(append_trade, trade_data)
     
     # Update balance
     balance_data["available_balance"] -= (margin_required + commission)
     balance_data["margin_used"] += margin_required
     balance_data["total_trades"] += 1
-    save_balance(balance_data)
+    await asyncio.to_thread(save_balance, balance_data)
     
     result_text = f"""✅ Trade Executed Successfully!
 Trade ID: {trade_id}
@@ -283,13 +426,9 @@ async def close_trade(args: Dict) -> List[TextContent]:
     notes = args.get("notes", "")
     
     # Find the trade
-    trade_found = None
-    with open(TRADES_CSV, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['trade_id'] == trade_id and row['status'] == 'open':
-                trade_found = row
-                break
+    trade_found = load_trades().get(trade_id)
+    if trade_found is not None and trade_found['status'] != 'open':
+        trade_found = None
     
     if not trade_found:
         return [TextContent(
@@ -314,7 +453,7 @@ async def close_trade(args: Dict) -> List[TextContent]:
     net_pnl = pnl - exit_commission
     
     # Update trade in CSV
-    exit_timestamp = datetime.now(timezone.utc).isoformat()
+    exit_timestamp = _now_iso()
     updates = {
         "status": "closed",
         "exit_price": exit_price,
@@ -322,7 +461,7 @@ async def close_trade(args: Dict) -> List[TextContent]:
         "pnl": net_pnl,
         "notes": f"{trade_found['notes']} | {notes}".strip(" | ")
     }
-    update_trade_in_csv(trade_id, updates)
+    await asyncio.to_thread(update_trade_in_csv, trade_id, updates)
     
     # Update balance
     balance_data = load_balance()
@@ -330,7 +469,7 @@ async def close_trade(args: Dict) -> List[TextContent]:
     balance_data["margin_used"] -= margin_used
     if net_pnl > 0:
         balance_data["winning_trades"] += 1
-    save_balance(balance_data)
+    await asyncio.to_thread(save_balance, balance_data)
     
     pnl_emoji = "🟢" if net_pnl > 0 else "🔴"
     result_text = f"""✅ Trade Closed!
@@ -372,14 +511,17 @@ async def get_portfolio_status(args: Dict) -> List[TextContent]:
 
 🔓 Open Positions:"""
     
+    # Collect lines and join once rather than growing the string per position
+    lines = [status_text]
     if open_trades:
-        for trade in open_trades:
-            status_text += f"""
-  • {trade['trade_id'][:8]} | {trade['token']} {trade['direction'].upper()} | ${float(trade['entry_price']):,.4f} | {trade['leverage']}x"""
+        lines.extend(
+            f"  • {trade['trade_id'][:8]} | {trade['token']} {trade['direction'].upper()} | ${float(trade['entry_price']):,.4f} | {trade['leverage']}x"
+            for trade in open_trades
+        )
     else:
-        status_text += "\n  • No open positions"
+        lines.append("  • No open positions")
     
-    return [TextContent(type="text", text=status_text)]
+    return [TextContent(type="text", text="\n".join(lines))]
 
 async def get_trade_history(args: Dict) -> List[TextContent]:
     """Get trade history with filters"""
@@ -387,20 +529,23 @@ async def get_trade_history(args: Dict) -> List[TextContent]:
     token_filter = args.get("token", "").upper()
     limit = args.get("limit", 50)
     
-    trades = []
-    with open(TRADES_CSV, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if status_filter != "all" and row['status'] != status_filter:
-                continue
-            if token_filter and row['token'] != token_filter:
-                continue
-            trades.append(row)
+    # Filter with column masks, comparing only the columns actually filtered on
+    cols = trade_columns()
+    rows = cols["rows"]
+    if status_filter != "all" and token_filter:
+        matches = np.flatnonzero((cols["status"] == status_filter) & (cols["token"] == token_filter))
+    elif status_filter != "all":
+        matches = np.flatnonzero(cols["status"] == status_filter)
+    elif token_filter:
+        matches = np.flatnonzero(cols["token"] == token_filter)
+    else:
+        matches = None  # no filter: every row, no mask at all
+    candidates = rows if matches is None else (rows[i] for i in matches)
     
-    # Sort by timestamp (most recent first) and limit
-    trades = sorted(trades, key=lambda x: x['timestamp'], reverse=True)[:limit]
+    # Most recent first, limited: a heap of `limit` rows instead of sorting every match
+    trades = heapq.nlargest(limit, candidates, key=itemgetter('timestamp'))
     
-    history_text = f"📜 Trade History (Filter: {status_filter}, Limit: {limit})\n\n"
+    parts = [f"📜 Trade History (Filter: {status_filter}, Limit: {limit})\n\n"]
     
     for trade in trades:
         status_emoji = "🔓" if trade['status'] == 'open' else "🔒"
@@ -410,13 +555,12 @@ async def get_trade_history(args: Dict) -> List[TextContent]:
             pnl_emoji = "🟢" if pnl > 0 else "🔴"
             pnl_text = f" | P&L: {pnl_emoji}${pnl:.2f}"
         
-        history_text += f"""{status_emoji} {trade['trade_id'][:8]} | {trade['token']} {trade['direction'].upper()} | ${float(trade['entry_price']):,.4f} | {trade['leverage']}x{pnl_text}
-"""
+        parts.append(f"{status_emoji} {trade['trade_id'][:8]} | {trade['token']} {trade['direction'].upper()} | ${float(trade['entry_price']):,.4f} | {trade['leverage']}x{pnl_text}\n")
     
     if not trades:
-        history_text += "No trades found matching criteria."
+        parts.append("No trades found matching criteria.")
     
-    return [TextContent(type="text", text=history_text)]
+    return [TextContent(type="text", text="".join(parts))]
 
 async def calculate_pnl(args: Dict) -> List[TextContent]:
     """Calculate unrealized PnL for open positions"""
@@ -426,42 +570,46 @@ async def calculate_pnl(args: Dict) -> List[TextContent]:
     if not open_trades:
         return [TextContent(type="text", text="📊 No open positions to calculate PnL")]
     
-    total_unrealized_pnl = 0.0
-    pnl_text = "📊 Unrealized P&L Analysis\n\n"
-    
-    for trade in open_trades:
-        token = trade['token']
+    # All positions at once: NaN current price where the token has no quote
+    tokens = [t['token'] for t in open_trades]
+    entry_price = _float_column(open_trades, 'entry_price')
+    current_price = np.fromiter(
+        (float(current_prices[t]) if t in current_prices else np.nan for t in tokens),
+        dtype=np.float64, count=len(open_trades)
+    )
+    is_long = np.fromiter((t['direction'] == "long" for t in open_trades), dtype=bool, count=len(open_trades))
+    price_change = np.where(is_long, current_price - entry_price, entry_price - current_price) / entry_price
+    unrealized_pnl = _float_column(open_trades, 'margin_used') * price_change * _float_column(open_trades, 'leverage')
+    total_unrealized_pnl = float(np.nansum(unrealized_pnl))
+    
+    parts = ["📊 Unrealized P&L Analysis\n\n"]
+    
+    for k, trade in enumerate(open_trades):
+        token = tokens[k]
         if token not in current_prices:
-            pnl_text += f"❌ {token}: No current price available\n"
+            parts.append(f"❌ {token}: No current price available\n")
             continue
         
-        entry_price = float(trade['entry_price'])
-        current_price = float(current_prices[token])
-        quantity = float(trade['quantity'])
-        leverage = float(trade['leverage'])
-        margin_used = float(trade['margin_used'])
-        direction = trade['direction']
-        
-        if direction == "long":
-            price_change = (current_price - entry_price) / entry_price
-        else:  # short
-            price_change = (entry_price - current_price) / entry_price
-        
-        unrealized_pnl = margin_used * price_change * leverage
-        total_unrealized_pnl += unrealized_pnl
-        
-        pnl_emoji = "🟢" if unrealized_pnl > 0 else "🔴"
-        change_pct = price_change * 100
+        pnl = unrealized_pnl[k]
+        pnl_emoji = "🟢" if pnl > 0 else "🔴"
+        change_pct = price_change[k] * 100
         
-        pnl_text += f"""{pnl_emoji} {trade['trade_id'][:8]} | {token} {direction.upper()}
-  Entry: ${entry_price:,.4f} → Current: ${current_price:,.4f} ({change_pct:+.2f}%)
-  Unrealized P&L: ${unrealized_pnl:.2f}
+        parts.append(f"""{pnl_emoji} {trade['trade_id'][:8]} | {token} {trade['direction'].upper()}
+  Entry: ${entry_price[k]:,.4f} → Current: ${current_price[k]:,.4f} ({change_pct:+.2f}%)
+  Unrealized P&L: ${pnl:.2f}
 
-"""
+""")
     
-    pnl_text += f"💰 Total Unrealized P&L: ${total_unrealized_pnl:.2f}"
+    parts.append(f"💰 Total Unrealized P&L: ${total_unrealized_pnl:.2f}")
     
-    return [TextContent(type="text", text=pnl_text)]
+    return [TextContent(type="text", text="".join(parts))]
+
+# (margin usage below, level, recommendation); the last row catches everything else
+_RISK_LEVELS = (
+    (20, "🟢 LOW", "Safe to open new positions"),
+    (50, "🟡 MODERATE", "Consider position sizing carefully"),
+    (float("inf"), "🔴 HIGH", "Reduce exposure before new trades"),
+)
 
 async def get_risk_metrics(args: Dict) -> List[TextContent]:
     """Get risk metrics and recommendations"""
@@ -474,6 +622,9 @@ async def get_risk_metrics(args: Dict) -> List[TextContent]:
     total_balance = balance_data['available_balance'] + balance_data['margin_used']
     margin_usage = (balance_data['margin_used'] / total_balance) * 100
     
+    # Risk level assessment
+    risk_level, recommendation = next((level, rec) for limit, level, rec in _RISK_LEVELS if margin_usage < limit)
+    
     risk_text = f"""⚖️ Risk Analysis
 📊 Current Risk Metrics:
   • Total Balance: ${total_balance:.2f}
@@ -482,38 +633,29 @@ async def get_risk_metrics(args: Dict) -> List[TextContent]:
   • Available Balance: ${balance_data['available_balance']:.2f}
 
 🛡️ Risk Recommendations:
+  • Risk Level: {risk_level}
+  • {recommendation}
 """
     
-    # Risk level assessment
-    if margin_usage < 20:
-        risk_level = "🟢 LOW"
-        recommendation = "Safe to open new positions"
-    elif margin_usage < 50:
-        risk_level = "🟡 MODERATE"
-        recommendation = "Consider position sizing carefully"
-    else:
-        risk_level = "🔴 HIGH"
-        recommendation = "Reduce exposure before new trades"
-    
-    risk_text += f"  • Risk Level: {risk_level}\n  • {recommendation}\n"
-    
     if proposed_order > 0:
         margin_needed = proposed_order / proposed_leverage if proposed_leverage > 1 else proposed_order
         new_margin_usage = ((balance_data['margin_used'] + margin_needed) / total_balance) * 100
         
-        risk_text += f"\n💭 Proposed Trade Analysis:\n"
-        risk_text += f"  • Order Value: ${proposed_order:.2f}\n"
-        risk_text += f"  • Leverage: {proposed_leverage}x\n"
-        risk_text += f"  • Margin Required: ${margin_needed:.2f}\n"
-        risk_text += f"  • New Margin Usage: {new_margin_usage:.1f}%\n"
-        
         if balance_data['available_balance'] >= margin_needed:
             if new_margin_usage < 70:
-                risk_text += "  • ✅ Trade approved - within risk limits"
+                verdict = "✅ Trade approved - within risk limits"
             else:
-                risk_text += "  • ⚠️ High risk - consider reducing size"
+                verdict = "⚠️ High risk - consider reducing size"
         else:
-            risk_text += "  • ❌ Insufficient balance for this trade"
+            verdict = "❌ Insufficient balance for this trade"
+        
+        risk_text += f"""
+💭 Proposed Trade Analysis:
+  • Order Value: ${proposed_order:.2f}
+  • Leverage: {proposed_leverage}x
+  • Margin Required: ${margin_needed:.2f}
+  • New Margin Usage: {new_margin_usage:.1f}%
+  • {verdict}"""
     
     return [TextContent(type="text", text=risk_text)]
 
@@ -9,6 +9,8 @@ import json
 import os
 import sys
 import tempfile
+import time
+from functools import lru_cache
 from io import BytesIO
 from typing import Any, Dict, Optional
 
@@ -28,110 +30,183 @@ load_dotenv()
 # Create server instance
 server = Server("mistral-vision-server")
 
-# Initialize Mistral client
+# Initialize Mistral client (once; reusing it keeps its HTTP connection pool warm)
+_mistral_client = None
+
 def get_mistral_client():
-    api_key = os.getenv("MISTRAL_API_KEY")
-    if not api_key:
-        raise ValueError("MISTRAL_API_KEY environment variable is required")
-    return Mistral(api_key=api_key)
+    global _mistral_client
+    if _mistral_client is None:
+        api_key = os.getenv("MISTRAL_API_KEY")
+        if not api_key:
+            raise ValueError("MISTRAL_API_KEY environment variable is required")
+        _mistral_client = Mistral(api_key=api_key)
+    return _mistral_client
+
+# Read size for streaming base64; a multiple of 3 so no chunk but the last gets padding
+_B64_CHUNK = 57 * 1024
+
+def _encode_file(image_path: str, prefix: bytes = b"") -> str:
+    """prefix + base64 of the file, encoded chunk by chunk into one buffer and decoded once."""
+    out = bytearray(prefix)
+    with open(image_path, "rb") as image_file:
+        while chunk := image_file.read(_B64_CHUNK):
+            out += base64.b64encode(chunk)
+    return out.decode('ascii')
 
 def encode_image_to_base64(image_path: str) -> str:
     """Encode image to base64 string."""
     try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return _encode_file(image_path)
+    except Exception as e:
+        raise Exception(f"Error encoding image: {e}")
+
+@lru_cache(maxsize=16)
+def _cached_data_url(image_path: str, mtime_ns: int, size: int) -> str:
+    # mtime/size are only part of the key: a rewritten file gets encoded again
+    try:
+        return _encode_file(image_path, b"data:image/png;base64,")
     except Exception as e:
         raise Exception(f"Error encoding image: {e}")
 
+def image_data_url(image_path: str) -> str:
+    """data: URL for an image, reused while the file is unchanged (same image, new prompt)."""
+    st = os.stat(image_path)
+    return _cached_data_url(image_path, st.st_mtime_ns, st.st_size)
+
+# Opt-in (VISION_UPLOAD_IMAGES=1): upload each image version to Mistral's file store once and
+# send its signed URL instead of re-sending the base64 data: URL with every prompt
+UPLOAD_IMAGES = os.getenv("VISION_UPLOAD_IMAGES") == "1"
+SIGNED_URL_HOURS = 24
+MAX_UPLOADED_URLS = 64
+# (path, mtime_ns, size) -> (signed url, monotonic time after which it's not reused)
+_uploaded_urls: Dict[tuple, tuple] = {}
+
+def _read_file(image_path: str) -> bytes:
+    with open(image_path, "rb") as image_file:
+        return image_file.read()
+
+async def uploaded_image_url(client, image_path: str) -> Optional[str]:
+    """Signed URL of the uploaded image, uploading it on first use; None if the upload fails."""
+    st = await asyncio.to_thread(os.stat, image_path)
+    key = (image_path, st.st_mtime_ns, st.st_size)
+    cached = _uploaded_urls.get(key)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    try:
+        content = await asyncio.to_thread(_read_file, image_path)
+        uploaded = await client.files.upload_async(
+            file={"file_name": os.path.basename(image_path), "content": content},
+            purpose="ocr",
+        )
+        signed = await client.files.get_signed_url_async(file_id=uploaded.id, expiry=SIGNED_URL_HOURS)
+    except Exception:
+        return None
+    if len(_uploaded_urls) >= MAX_UPLOADED_URLS:
+        _uploaded_urls.pop(next(iter(_uploaded_urls)))
+    # stop reusing the URL a few minutes before it actually expires
+    _uploaded_urls[key] = (signed.url, time.monotonic() + SIGNED_URL_HOURS * 3600 - 300)
+    return signed.url
+
+
+# Tool descriptors are static; built once at import
+_TOOLS: list[Tool] = [
+    Tool(
+        name="analyze_existing_image",
+        description="Analyze an existing image file using Mistral Vision",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "image_path": {
+                    "type": "string",
+                    "description": "Path to the image file to analyze"
+                },
+                "prompt": {
+                    "type": "string",
+                    "description": "What to analyze in the image"
+                },
+                "model": {
+                    "type": "string",
+                    "description": "Mistral vision model to use",
+                    "enum": ["pixtral-12b-latest", "pixtral-large-latest", "mistral-medium-latest", "mistral-small-latest"],
+                    "default": "pixtral-12b-latest"
+                }
+            },
+            "required": ["image_path", "prompt"]
+        }
+    )
+]
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
     """List available tools."""
-    return [
-  
-        Tool(
-            name="analyze_existing_image",
-            description="Analyze an existing image file using Mistral Vision",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "image_path": {
-                        "type": "string",
-                        "description": "Path to the image file to analyze"
-                    },
-                    "prompt": {
-                        "type": "string",
-                        "description": "What to analyze in the image"
+    return _TOOLS
+
+async def _analyze_existing_image(client, arguments: Dict[str, Any]) -> list[TextContent]:
+    """Describe an image file with a Mistral vision model."""
+    try:
+        image_path = arguments.get("image_path")
+        prompt = arguments.get("prompt", "What's in this image?")
+        model = arguments.get("model", "pixtral-12b-latest")
+        
+        if not os.path.exists(image_path):
+            return [TextContent(type="text", text=f"Image file not found: {image_path}")]
+        
+        image_url = await uploaded_image_url(client, image_path) if UPLOAD_IMAGES else None
+        if image_url is None:
+            # Encode image (cached per file version); file I/O off the event loop
+            image_url = await asyncio.to_thread(image_data_url, image_path)
+        
+        # Analyze with Mistral
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
                     },
-                    "model": {
-                        "type": "string",
-                        "description": "Mistral vision model to use",
-                        "enum": ["pixtral-12b-latest", "pixtral-large-latest", "mistral-medium-latest", "mistral-small-latest"],
-                        "default": "pixtral-12b-latest"
+                    {
+                        "type": "image_url",
+                        "image_url": image_url
                     }
-                },
-                "required": ["image_path", "prompt"]
+                ]
             }
+        ]
+        
+        # Async client call: the server keeps handling other messages during inference
+        response = await client.chat.complete_async(
+            model=model,
+            messages=messages
         )
-    ]
+        
+        result = response.choices[0].message.content
+        return [TextContent(type="text", text=result)]
+        
+    except Exception as e:
+        return [TextContent(type="text", text=f"Error in image analysis: {e}")]
+
+# Stand-in for a call without arguments; only read, never mutated
+_NO_ARGUMENTS: Dict[str, Any] = {}
+
+# Tool name -> handler
+_HANDLERS = {
+    "analyze_existing_image": _analyze_existing_image,
+}
 
 @server.call_tool()
 async def call_tool(name: str, arguments: Dict[str, Any] | None) -> list[TextContent]:
     """Handle tool calls."""
-    if arguments is None:
-        arguments = {}
+    arguments = arguments or _NO_ARGUMENTS
     
     try:
         client = get_mistral_client()
     except Exception as e:
         return [TextContent(type="text", text=f"Error initializing Mistral client: {e}")]
     
-    
-    
-    if name == "analyze_existing_image":
-        try:
-            image_path = arguments.get("image_path")
-            prompt = arguments.get("prompt", "What's in this image?")
-            model = arguments.get("model", "pixtral-12b-latest")
-            
-            if not os.path.exists(image_path):
-                return [TextContent(type="text", text=f"Image file not found: {image_path}")]
-            
-            # Encode image
-            base64_image = encode_image_to_base64(image_path)
-            
-            # Analyze with Mistral
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": f"data:image/png;base64,{base64_image}"
-                        }
-                    ]
-                }
-            ]
-            
-            response = client.chat.complete(
-                model=model,
-                messages=messages
-            )
-            
-            result = response.choices[0].message.content
-            return [TextContent(type="text", text=result)]
-            
-        except Exception as e:
-            return [TextContent(type="text", text=f"Error in image analysis: {e}")]
-    
-   
-    
-    else:
+    handler = _HANDLERS.get(name)
+    if handler is None:
         return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    return await handler(client, arguments)
 
 async def main():
     """Main entry point for the server."""
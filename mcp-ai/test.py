@@ -2,6 +2,10 @@ import os
 from mistralai import Mistral
 from dotenv import load_dotenv
 import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 load_dotenv()
 api_key = os.environ["MISTRAL_API_KEY"]
 client = Mistral(api_key)
@@ -27,4 +31,7 @@ response = client.beta.conversations.start(
     inputs="generate an image of a cat wearing a hat and holding a sign that says hello world",
 )
 
-print(json.dumps(response, indent=4, default=str))
\ No newline at end of file
+if orjson is not None:
+    print(orjson.dumps(response, option=orjson.OPT_INDENT_2, default=str).decode())
+else:
+    print(json.dumps(response, indent=4, default=str))
\ No newline at end of file
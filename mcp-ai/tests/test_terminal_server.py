@@ -0,0 +1,49 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "mcp_servers"))
+
+
+@unittest.skipUnless(importlib.util.find_spec("mcp"), "mcp is not installed")
+class RunBatchInShellTest(unittest.TestCase):
+    """Command text must not be able to break the framing around it in the shared shell."""
+
+    def setUp(self):
+        import terminal_server
+        self.ts = terminal_server
+        self.cwd = tempfile.mkdtemp()
+
+    def run_batch(self, *commands):
+        cmds = [{"command": c, "working_directory": self.cwd} for c in commands]
+        coro = self.ts._run_batch_in_shell(list(range(1, len(cmds) + 1)), cmds)
+        # A command that swallows the markers would otherwise hang until CMD_TIMEOUT
+        return asyncio.run(asyncio.wait_for(coro, timeout=10))
+
+    def test_unbalanced_quote_is_a_syntax_error(self):
+        bad, ok = self.run_batch('echo "abc', "echo next")
+        self.assertFalse(bad["timed_out"])
+        self.assertNotEqual(bad["return_code"], 0)
+        self.assertEqual(bad["stdout"], "")
+        self.assertTrue(ok["success"])
+        self.assertEqual(ok["stdout"], "next\n")
+
+    def test_stray_paren_does_not_close_the_subshell(self):
+        bad, ok = self.run_batch("echo a )", "echo next")
+        self.assertFalse(bad["timed_out"])
+        self.assertNotEqual(bad["return_code"], 0)
+        self.assertEqual(bad["stdout"], "")
+        self.assertTrue(ok["success"])
+        self.assertEqual(ok["stdout"], "next\n")
+
+    def test_state_does_not_leak_between_commands(self):
+        first, second = self.run_batch("cd / && X=1 && exit 3", 'pwd; echo "${X:-unset}"')
+        self.assertEqual(first["return_code"], 3)
+        self.assertEqual(second["stdout"], f"{os.path.realpath(self.cwd)}\nunset\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
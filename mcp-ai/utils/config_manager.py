@@ -4,64 +4,109 @@
 import json
 import os
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from mcp import StdioServerParameters
 
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same file format
+    orjson = None
+
+def _read_json(path: Path) -> Any:
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _json_line(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj, separators=(',', ':')).encode() + b"\n"
+
 class ConfigManager:
-    def __init__(self, config_path: str = "mcp_config.json", registry_path: str = "server_registry.json"):
+    def __init__(self, config_path: str = "mcp_config.json", registry_path: str = "server_registry.json",
+                 install_log_path: Optional[str] = None):
         self.config_path = Path(config_path)
         self.registry_path = Path(registry_path)
+        # Install/remove history is an append-only JSON Lines file next to the config,
+        # so recording an event never rewrites the config itself
+        self.install_log_path = (Path(install_log_path) if install_log_path
+                                 else self.config_path.with_name("installation_log.jsonl"))
         self._config = None
         self._registry = None
+        self._all_servers = None
+        self._cap_index = None
+    
+    def invalidate(self):
+        """Drop cached config/registry so the next access re-reads the files"""
+        self._config = None
+        self._registry = None
+        self._all_servers = None
+        self._cap_index = None
     
     def load_config(self) -> Dict[str, Any]:
         """Load MCP configuration"""
         if self._config is None:
             if self.config_path.exists():
-                with open(self.config_path, 'r') as f:
-                    self._config = json.load(f)
+                self._config = _read_json(self.config_path)
+                # Older configs kept the log inline: move it to the log file once
+                legacy_log = self._config.pop("installation_log", None)
+                if legacy_log:
+                    for entry in legacy_log:
+                        self._log_installation(entry)
+                    self.save_config()
             else:
-                self._config = {"default_servers": {}, "dynamic_servers": {}, "installation_log": []}
+                self._config = {"default_servers": {}, "dynamic_servers": {}}
         return self._config
     
     def load_registry(self) -> Dict[str, Any]:
         """Load server registry"""
         if self._registry is None:
             if self.registry_path.exists():
-                with open(self.registry_path, 'r') as f:
-                    self._registry = json.load(f)
+                self._registry = _read_json(self.registry_path)
             else:
                 self._registry = {"servers": {}, "capability_mapping": {}}
         return self._registry
     
     def save_config(self):
         """Save configuration to file"""
-        with open(self.config_path, 'w') as f:
-            json.dump(self._config, f, indent=2)
+        if orjson is not None:
+            self.config_path.write_bytes(orjson.dumps(self._config, option=orjson.OPT_INDENT_2))
+        else:
+            with open(self.config_path, 'w') as f:
+                json.dump(self._config, f, indent=2)
+    
+    def _log_installation(self, entry: Dict[str, Any]):
+        """Append one event to the installation log"""
+        with open(self.install_log_path, 'ab') as f:
+            f.write(_json_line(entry))
     
     def get_all_servers(self) -> Dict[str, Dict[str, Any]]:
-        """Get all servers (default + dynamic)"""
-        config = self.load_config()
-        all_servers = {}
-        all_servers.update(config.get("default_servers", {}))
-        all_servers.update(config.get("dynamic_servers", {}))
-        return all_servers
+        """Get all servers (default + dynamic); cached until the config changes or invalidate()"""
+        if self._all_servers is None:
+            config = self.load_config()
+            all_servers = {}
+            all_servers.update(config.get("default_servers", {}))
+            all_servers.update(config.get("dynamic_servers", {}))
+            self._all_servers = all_servers
+        return self._all_servers
     
     def add_dynamic_server(self, name: str, server_config: Dict[str, Any]):
         """Add a new dynamic server"""
         config = self.load_config()
         config["dynamic_servers"][name] = server_config
         
+        self._config = config
+        self._all_servers = None
+        self.save_config()
+        
         # Log the installation
-        config["installation_log"].append({
+        self._log_installation({
             "server": name,
             "action": "installed",
             "timestamp": str(Path().cwd()),
             "config": server_config
         })
-        
-        self._config = config
-        self.save_config()
     
     def remove_dynamic_server(self, name: str):
         """Remove a dynamic server"""
@@ -69,15 +114,16 @@ class ConfigManager:
         if name in config["dynamic_servers"]:
             del config["dynamic_servers"][name]
             
+            self._config = config
+            self._all_servers = None
+            self.save_config()
+            
             # Log the removal
-            config["installation_log"].append({
+            self._log_installation({
                 "server": name,
                 "action": "removed",
                 "timestamp": str(Path().cwd())
             })
-            
-            self._config = config
-            self.save_config()
             return True
         return False
     
@@ -101,24 +147,27 @@ class ConfigManager:
             env=env if env else None,
         )
     
+    def _capability_index(self) -> Dict[str, set]:
+        """Lowercased capability -> servers, from both capability_mapping and per-server lists"""
+        if self._cap_index is None:
+            registry = self.load_registry()
+            index = {}
+            for cap, servers in registry.get("capability_mapping", {}).items():
+                index.setdefault(cap.lower(), set()).update(servers)
+            for server_name, server_info in registry.get("servers", {}).items():
+                for cap in server_info.get("capabilities", []):
+                    index.setdefault(cap.lower(), set()).add(server_name)
+            self._cap_index = index
+        return self._cap_index
+    
     def find_servers_by_capability(self, capability: str) -> List[str]:
-        """Find servers that provide a specific capability"""
-        registry = self.load_registry()
-        matching_servers = []
-        
-        # Check capability mapping
-        capability_mapping = registry.get("capability_mapping", {})
-        for cap, servers in capability_mapping.items():
-            if capability.lower() in cap.lower():
-                matching_servers.extend(servers)
-        
-        # Also check server capabilities directly
-        for server_name, server_info in registry.get("servers", {}).items():
-            server_capabilities = server_info.get("capabilities", [])
-            if any(capability.lower() in cap.lower() for cap in server_capabilities):
-                matching_servers.append(server_name)
-        
-        return list(set(matching_servers))  # Remove duplicates
+        """Find servers that provide a specific capability (case-insensitive substring match)"""
+        needle = capability.lower()
+        matches = set()
+        for cap, servers in self._capability_index().items():
+            if needle in cap:
+                matches |= servers
+        return list(matches)
     
     def get_server_info(self, server_name: str) -> Dict[str, Any]:
         """Get detailed information about a server from registry"""
@@ -127,5 +176,6 @@ class ConfigManager:
     
     def is_server_installed(self, server_name: str) -> bool:
         """Check if a server is already installed/configured"""
-        all_servers = self.get_all_servers()
-        return server_name in all_servers
\ No newline at end of file
+        # Two key lookups; no need to build the merged get_all_servers() view for this
+        config = self.load_config()
+        return server_name in config.get("dynamic_servers", ()) or server_name in config.get("default_servers", ())
\ No newline at end of file